@@ -2,69 +2,497 @@
 AI analyzer module for extracting embeddings and categories from images and videos.
 """
 import os
+import hashlib
+import queue
+import threading
+from functools import lru_cache
 import torch
+import torch.nn.functional as F
+import torchvision.transforms as T
+from torchvision.io import read_image, ImageReadMode
 import numpy as np
 from PIL import Image
 import cv2
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Dict
 import clip
+from clip.simple_tokenizer import SimpleTokenizer
 from sentence_transformers import SentenceTransformer
 
+# Decord is optional: it decodes a whole batch of sampled frames in one call
+try:
+    import decord
+except ImportError:
+    decord = None
+
+# PyAV is optional: it can seek and decode keyframes only, skipping every P/B-frame
+try:
+    import av
+except ImportError:
+    av = None
+
 # Try to use GPU if available
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
+# Inputs have fixed shapes, so let cuDNN autotune once and allow TF32 matmuls on Ampere+
+if device == "cuda":
+    torch.backends.cudnn.benchmark = True
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+
+# CLIP's image normalization constants (same values used by clip_preprocess)
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+# Default labels scored by generate_categories
+DEFAULT_CATEGORIES = [
+    "a person drawing", "a person painting", "a person cooking",
+    "a person eating", "a person exercising", "a person working",
+    "a person reading", "a person sleeping", "a person talking",
+    "outdoor scene", "indoor scene", "nature", "city", "beach",
+    "party", "celebration", "family", "friends", "pets", "animals"
+]
+
+# Prompt formulations averaged by encode_text_query
+QUERY_TEMPLATES = [
+    "{}",  # Original
+    "a photo of {}",  # Photo description
+    "a video of {}",  # Video description
+    "an image showing {}",  # Image description
+]
+
+# With quantize_text on CPU, the int8 text encoder is kept only if every probe query's
+# embedding stays at least this cosine-similar to the float32 one
+QUANTIZED_TEXT_MIN_COSINE = 0.99
+QUANTIZED_TEXT_PROBES = ["red car", "a dog playing on the beach", "birthday party with friends",
+                         "sunset over the mountains", "screenshot of a document"]
+
+# Exponent applied to evenly spaced sample positions to bias video frames toward the start
+FRAME_SAMPLING_BIAS = 1.3
+
+# Number of decoded video frames buffered between the reader thread and preprocessing
+VIDEO_FRAME_PREFETCH = 4
+
+
+def _to_device(tensor: torch.Tensor) -> torch.Tensor:
+    """
+    Move a CPU tensor to the target device without blocking the host.
+    
+    Copies from pageable memory are synchronous even with non_blocking=True, so on CUDA
+    the tensor is staged in pinned memory first to let the transfer overlap with host work.
+    """
+    if device == "cuda":
+        tensor = tensor.pin_memory()
+    return tensor.to(device, non_blocking=True)
+
 
 class MediaAnalyzer:
     """Analyzes media files and generates embeddings for semantic search."""
     
-    def __init__(self, model_size="ViT-B/32", num_video_frames=16):
+    def __init__(self, model_size="ViT-B/32", num_video_frames=16, quantize_text: bool = False):
         """
         Initialize the AI models.
         
         Args:
             model_size: CLIP model size - "ViT-B/32" (faster), "ViT-B/16" (better), "ViT-L/14" (best but slow)
             num_video_frames: Number of frames to sample from videos
+            quantize_text: On CPU, run the CLIP text transformer's linear layers as dynamic int8
+                (roughly 2x faster query encoding); ignored on GPU
         """
         print(f"Loading AI models on {device}...")
         
         # Load CLIP model for vision embeddings
         # Options: "ViT-B/32" (fastest, default), "ViT-B/16" (better), "ViT-L/14" (best but slower)
         self.clip_model, self.clip_preprocess = clip.load(model_size, device=device)
+        # Run CLIP in its native FP16 on CUDA (half the weight bandwidth, tensor-core matmuls)
+        if device == "cuda":
+            self.clip_model = self.clip_model.half()
+            # channels_last lets cuDNN pick tensor-core kernels for the patch-embedding conv
+            self.clip_model.visual = self.clip_model.visual.to(memory_format=torch.channels_last)
         self.clip_model.eval()
+        self.dtype = self.clip_model.dtype
+        if device == "cpu" and quantize_text:
+            self._quantize_text_encoder()
+        
+        # Tensor-based equivalent of clip_preprocess so resize/normalize run on the GPU
+        input_resolution = self.clip_model.visual.input_resolution
+        self.gpu_preprocess = T.Compose([
+            T.Resize(input_resolution, interpolation=T.InterpolationMode.BICUBIC, antialias=True),
+            T.CenterCrop(input_resolution),
+            T.ConvertImageDtype(torch.float32),
+            T.Normalize(mean=CLIP_MEAN, std=CLIP_STD),
+        ])
+        self.input_resolution = input_resolution
+        
+        # Precomputed normalization constants for inputs that are already model-sized
+        self._clip_mean = torch.tensor(CLIP_MEAN, device=device).view(3, 1, 1)
+        self._clip_std = torch.tensor(CLIP_STD, device=device).view(3, 1, 1)
         
         # Load sentence transformer for text embeddings
         self.text_model = SentenceTransformer('all-MiniLM-L6-v2')
         
         # Configuration
         self.num_video_frames = num_video_frames
+        # Embeddings depend on the model and the video frame count; cached embeddings are keyed by both
+        self.cache_namespace = f"{model_size}/{num_video_frames}"
         self.embedding_dim = self.clip_model.visual.output_dim  # Get actual embedding dimension
         
+        # Staging buffer for preprocessed video frames, reused across videos
+        self._video_batch_buf = torch.empty(
+            num_video_frames, 3, self.input_resolution, self.input_resolution, device=device, dtype=self.dtype
+        )
+        self._video_lock = threading.Lock()
+        
+        # Zero vector for media that can't be processed; kept read-only and returned as
+        # copies, so callers may normalize or write results in place
+        self._zero_embedding = np.zeros(self.embedding_dim, dtype=np.float32)
+        self._zero_embedding.setflags(write=False)
+        
+        # Compiled encoders fuse kernels and cut dispatcher overhead for every other shape
+        self._image_encoder = self._compile_encoder(
+            self.clip_model.encode_image,
+            torch.zeros(1, 3, input_resolution, input_resolution, device=device, dtype=self.dtype)
+        )
+        # The text encoder also sees batched queries and category lists, so it is warmed
+        # with a second batch size: the one recompile with a dynamic batch dimension then
+        # happens here instead of on the first batched search
+        self._text_encoder = self._compile_encoder(
+            self.clip_model.encode_text,
+            torch.zeros(len(QUERY_TEMPLATES), self.clip_model.context_length, device=device, dtype=torch.long),
+            torch.zeros(2 * len(QUERY_TEMPLATES), self.clip_model.context_length, device=device, dtype=torch.long)
+        )
+        
+        # Pre-tokenize the fixed parts of the query templates
+        self._tokenizer = SimpleTokenizer()
+        self._sot_token = self._tokenizer.encoder["<|startoftext|>"]
+        self._eot_token = self._tokenizer.encoder["<|endoftext|>"]
+        self._template_ids = [
+            tuple(self._tokenizer.encode(part) for part in template.split("{}", 1))
+            for template in QUERY_TEMPLATES
+        ]
+        
+        # Batch-1 image and 4-prompt text passes are launch-overhead bound, so on CUDA
+        # they are captured once as CUDA graphs and replayed per call
+        self._graph_lock = threading.Lock()
+        self._image_graph = None
+        self._text_graph = None
+        if device == "cuda":
+            try:
+                self._image_graph = self._capture_graph(
+                    self.clip_model.encode_image,
+                    torch.zeros(1, 3, input_resolution, input_resolution, device=device, dtype=self.dtype)
+                )
+                self._text_graph = self._capture_graph(
+                    self.clip_model.encode_text,
+                    torch.zeros(len(QUERY_TEMPLATES), self.clip_model.context_length, device=device, dtype=torch.long)
+                )
+            except Exception as e:
+                print(f"CUDA graph capture failed, using eager inference: {e}")
+                self._image_graph = None
+                self._text_graph = None
+        
+        # Category text features never change for a given list, so encode each list once
+        self._encode_categories = lru_cache(maxsize=32)(self._encode_category_features)
+        self._default_cat_feats = self._encode_categories(tuple(DEFAULT_CATEGORIES))
+        
+        # Users often repeat searches while browsing results, so keep recent query embeddings
+        self._encode_query_cached = lru_cache(maxsize=256)(self._encode_text_query_uncached)
+        
         print(f"Models loaded successfully! Using {model_size} with {num_video_frames} video frames.")
         print(f"Embedding dimension: {self.embedding_dim}")
     
-    def extract_image_embedding(self, image_path: str) -> np.ndarray:
+    def _quantize_text_encoder(self):
         """
-        Extract embedding from an image using CLIP.
+        Swap the CLIP text transformer for a dynamic int8 copy if it stays accurate.
+        
+        QUANTIZED_TEXT_PROBES are encoded with both transformers; the float32 one is kept
+        if any probe's cosine similarity falls below QUANTIZED_TEXT_MIN_COSINE.
+        """
+        float_transformer = self.clip_model.transformer
+        quantized_transformer = self._quantize_int8(float_transformer)
+        if quantized_transformer is float_transformer:
+            return
+        
+        try:
+            tokens = clip.tokenize(QUANTIZED_TEXT_PROBES).to(device)
+            with torch.inference_mode():
+                reference = F.normalize(self.clip_model.encode_text(tokens).float(), dim=-1)
+                self.clip_model.transformer = quantized_transformer
+                quantized = F.normalize(self.clip_model.encode_text(tokens).float(), dim=-1)
+            min_cosine = (reference * quantized).sum(dim=-1).min().item()
+        except Exception as e:
+            print(f"int8 text encoder check failed, using float32 text encoder: {e}")
+            self.clip_model.transformer = float_transformer
+            return
+        
+        if min_cosine < QUANTIZED_TEXT_MIN_COSINE:
+            print(f"int8 text encoder too far from float32 (cosine {min_cosine:.4f} < "
+                  f"{QUANTIZED_TEXT_MIN_COSINE}), using float32 text encoder")
+            self.clip_model.transformer = float_transformer
+        else:
+            print(f"Using int8 text encoder (min probe cosine {min_cosine:.4f})")
+    
+    @staticmethod
+    def _quantize_int8(module: torch.nn.Module) -> torch.nn.Module:
+        """
+        Quantize a module's linear layers to dynamic int8, keeping it as is if unsupported.
+        
+        Weights are stored as int8 and activations are quantized on the fly per batch, so
+        no calibration data is needed.
+        
+        Args:
+            module: Module to quantize (the CLIP text transformer)
+            
+        Returns:
+            Quantized copy of the module, or the module itself on failure
+        """
+        try:
+            return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+        except Exception as e:
+            print(f"int8 quantization unavailable, using float32 text encoder: {e}")
+            return module
+    
+    @staticmethod
+    def _compile_encoder(fn, *example_inputs: torch.Tensor):
+        """
+        Compile an encoder with torch.compile, falling back to eager if it isn't supported.
+        
+        Compilation is lazy, so the example inputs are run once to surface failures here
+        rather than on the first real call.
+        
+        Args:
+            fn: Encoder function to compile
+            example_inputs: Inputs used to trigger compilation, one per shape to prepare
+            
+        Returns:
+            Compiled encoder, or fn itself if compilation failed
+        """
+        if not hasattr(torch, "compile"):
+            return fn
+        
+        for options in ({"mode": "reduce-overhead", "fullgraph": True}, {"mode": "default"}):
+            try:
+                compiled = torch.compile(fn, **options)
+                with torch.inference_mode():
+                    for example_input in example_inputs:
+                        compiled(example_input)
+                return compiled
+            except Exception as e:
+                print(f"torch.compile ({options['mode']}) unavailable for {fn.__name__}: {e}")
+        
+        return fn
+    
+    @staticmethod
+    def _capture_graph(fn, static_input: torch.Tensor) -> Tuple:
+        """
+        Capture a fixed-shape forward pass as a CUDA graph.
+        
+        Args:
+            fn: Encoder function to capture
+            static_input: Input buffer that is copied into before each replay
+            
+        Returns:
+            (graph, static_input, static_output) tuple
+        """
+        # Warm up on a side stream so lazy initialization isn't captured
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.inference_mode(), torch.cuda.stream(stream):
+            for _ in range(3):
+                fn(static_input)
+        torch.cuda.current_stream().wait_stream(stream)
+        
+        graph = torch.cuda.CUDAGraph()
+        with torch.inference_mode(), torch.cuda.graph(graph):
+            static_output = fn(static_input)
+        
+        return graph, static_input, static_output
+    
+    def _replay_or_run(self, captured: Optional[Tuple], fn, inputs: torch.Tensor) -> torch.Tensor:
+        """
+        Run an encoder, replaying its CUDA graph when the input shape matches the capture.
+        
+        Args:
+            captured: (graph, static_input, static_output) tuple or None
+            fn: Eager encoder function used when no graph applies
+            inputs: Encoder input tensor
+            
+        Returns:
+            Encoder output
+        """
+        if captured is not None and inputs.shape == captured[1].shape:
+            graph, static_input, static_output = captured
+            # Graph buffers are shared, so replays must not interleave across threads
+            with self._graph_lock:
+                static_input.copy_(inputs)
+                graph.replay()
+                return static_output.clone()
+        
+        return fn(inputs)
+    
+    def _encode_image(self, image_tensor: torch.Tensor) -> torch.Tensor:
+        """Run CLIP's image encoder on a preprocessed batch."""
+        image_tensor = image_tensor.to(self.dtype).contiguous(memory_format=torch.channels_last)
+        return self._replay_or_run(self._image_graph, self._image_encoder, image_tensor)
+    
+    def _encode_text(self, text_tokens: torch.Tensor) -> torch.Tensor:
+        """Run CLIP's text encoder on a batch of tokens."""
+        return self._replay_or_run(self._text_graph, self._text_encoder, text_tokens)
+    
+    def decode_image(self, image_path: str) -> torch.Tensor:
+        """
+        Decode an image file into a uint8 tensor on the CPU.
+        
+        Decoding is I/O and libjpeg bound and doesn't touch the model, so it is safe to
+        run on worker threads while the device encodes other images.
         
         Args:
             image_path: Path to the image file
             
         Returns:
-            Normalized embedding vector
+            (3, H, W) uint8 RGB tensor
         """
+        if image_path.lower().endswith(('.jpg', '.jpeg')):
+            # libjpeg can decode straight to a fraction of full size; the GPU resize finishes the job
+            image = _open_rgb(image_path, self.input_resolution)
+            return torch.from_numpy(np.array(image)).permute(2, 0, 1)
+        
         try:
+            return read_image(image_path, mode=ImageReadMode.RGB)
+        except RuntimeError:
+            # torchvision can't decode this format (e.g. HEIC, WebP), fall back to PIL
             image = Image.open(image_path).convert('RGB')
-            image_tensor = self.clip_preprocess(image).unsqueeze(0).to(device)
+            return torch.from_numpy(np.array(image)).permute(2, 0, 1)
+    
+    def _preprocess_image(self, image: torch.Tensor) -> torch.Tensor:
+        """
+        Preprocess a decoded image on the target device.
+        
+        Args:
+            image: (3, H, W) uint8 RGB tensor or array
+            
+        Returns:
+            Preprocessed (3, H, W) float tensor on the target device
+        """
+        if isinstance(image, np.ndarray):
+            image = torch.from_numpy(image)
+        image = _to_device(image)
+        
+        # Pre-resized inputs (see resize_cache) skip the bicubic resize entirely
+        if tuple(image.shape[-2:]) == (self.input_resolution, self.input_resolution):
+            return self._fast_totensor_normalize(image)
+        
+        return self.gpu_preprocess(image)
+    
+    def _load_image_tensor(self, image_path: str) -> torch.Tensor:
+        """
+        Decode an image and preprocess it on the target device.
+        
+        Args:
+            image_path: Path to the image file
             
-            with torch.no_grad():
-                image_features = self.clip_model.encode_image(image_tensor)
-                # Normalize the embedding
-                image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+        Returns:
+            Preprocessed (3, H, W) float tensor on the target device
+        """
+        return self._preprocess_image(self.decode_image(image_path))
+    
+    def _fast_totensor_normalize(self, image: torch.Tensor) -> torch.Tensor:
+        """
+        Convert an already model-sized uint8 image tensor to a normalized float tensor.
+        
+        Args:
+            image: (3, H, W) uint8 tensor matching the model input resolution
             
-            return image_features.cpu().numpy().flatten()
+        Returns:
+            Normalized (3, H, W) float tensor
+        """
+        return (image.float() / 255.0 - self._clip_mean) / self._clip_std
+    
+    def _image_features(self, image_path: str) -> torch.Tensor:
+        """
+        Load, preprocess and encode an image.
+        
+        Args:
+            image_path: Path to the image file
+            
+        Returns:
+            Normalized (1, D) image features on the target device
+        """
+        image_tensor = self._load_image_tensor(image_path).unsqueeze(0)
+        
+        with torch.inference_mode():
+            image_features = self._encode_image(image_tensor)
+            # Normalize the embedding
+            image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+        
+        return image_features
+    
+    def extract_image_embedding(self, image_path: str) -> np.ndarray:
+        """
+        Extract embedding from an image using CLIP.
+        
+        Args:
+            image_path: Path to the image file
+            
+        Returns:
+            Normalized embedding vector
+        """
+        try:
+            image_features = self._image_features(image_path)
+            return image_features.float().cpu().numpy().flatten()
         except Exception as e:
             print(f"Error processing image {image_path}: {e}")
-            return np.zeros(self.embedding_dim)  # Return zero vector on error
+            return self._zero_embedding.copy()  # Return zero vector on error
+    
+    def extract_image_embeddings_batch(self, image_paths: List[str],
+                                       decoded_images: Optional[List[Optional[torch.Tensor]]] = None) -> np.ndarray:
+        """
+        Extract embeddings for a group of images with a single CLIP forward pass.
+        
+        Args:
+            image_paths: Paths to the image files
+            decoded_images: Images already decoded with decode_image or
+                preprocess_image_file (None entries mark failed decodes); the files
+                are decoded here if not given
+            
+        Returns:
+            (N, D) array of normalized embeddings in input order; images that fail to load get zero vectors
+        """
+        image_tensors = []
+        valid_rows = []
+        for i, image_path in enumerate(image_paths):
+            try:
+                if decoded_images is None:
+                    image = self.decode_image(image_path)
+                elif decoded_images[i] is None:
+                    continue
+                else:
+                    image = decoded_images[i]
+                image_tensors.append(self._preprocess_image(image))
+                valid_rows.append(i)
+            except Exception as e:
+                print(f"Error processing image {image_path}: {e}")
+        
+        embeddings = np.zeros((len(image_paths), self.embedding_dim), dtype=np.float32)
+        if not image_tensors:
+            return embeddings
+        
+        try:
+            with torch.inference_mode():
+                image_features = F.normalize(self._encode_image(torch.stack(image_tensors)), dim=-1)
+            embeddings[valid_rows] = image_features.float().cpu().numpy()
+        except Exception as e:
+            # e.g. out of memory on a large batch: encode one image at a time so a
+            # single failure only costs that image
+            print(f"Batched encoding failed, retrying images one by one: {e}")
+            for row, image_tensor in zip(valid_rows, image_tensors):
+                try:
+                    with torch.inference_mode():
+                        features = F.normalize(self._encode_image(image_tensor.unsqueeze(0)), dim=-1)
+                    embeddings[row] = features.squeeze(0).float().cpu().numpy()
+                except Exception as e:
+                    print(f"Error processing image {image_paths[row]}: {e}")
+        
+        return embeddings
     
     def extract_video_embedding(self, video_path: str, num_frames: int = None) -> np.ndarray:
         """
@@ -81,57 +509,254 @@ class MediaAnalyzer:
             num_frames = self.num_video_frames
             
         try:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                return np.zeros(self.embedding_dim)
+            batch = None
+            if av is not None:
+                try:
+                    batch = self._load_video_keyframes_av(video_path, num_frames)
+                except Exception as e:
+                    print(f"Keyframe decoding failed for {video_path}, falling back: {e}")
             
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            if total_frames == 0:
-                return np.zeros(self.embedding_dim)
+            if batch is None and decord is not None:
+                batch = self._load_video_frames_decord(video_path, num_frames)
+            elif batch is None:
+                # The cv2 path fills the shared staging buffer, which stays in use until
+                # encoded, so only it is serialized
+                with self._video_lock:
+                    batch = self._load_video_frames_cv2(video_path, num_frames)
+                    if batch is not None:
+                        return self._embed_frames(batch)
             
-            frame_embeddings = []
-            
-            # Sample frames evenly throughout the video, with more focus on beginning/middle
-            # (videos often have most relevant content in first half)
-            if num_frames <= total_frames:
-                # Use weighted sampling: more frames from beginning
-                first_half = int(num_frames * 0.6)
-                second_half = num_frames - first_half
+            if batch is None:
+                return self._zero_embedding.copy()
+            return self._embed_frames(batch)
                 
-                indices_first = np.linspace(0, total_frames // 2, first_half, dtype=int)
-                indices_second = np.linspace(total_frames // 2, total_frames - 1, second_half, dtype=int)
-                frame_indices = np.concatenate([indices_first, indices_second])
+        except Exception as e:
+            print(f"Error processing video {video_path}: {e}")
+            return self._zero_embedding.copy()
+    
+    def _embed_frames(self, batch: torch.Tensor) -> np.ndarray:
+        """
+        Encode sampled video frames in a single forward pass and average them.
+        
+        Args:
+            batch: (N, 3, H, W) preprocessed frames on the target device
+            
+        Returns:
+            Normalized average embedding vector
+        """
+        with torch.inference_mode():
+            frame_features = F.normalize(self._encode_image(batch), dim=-1)
+            # Average the frame embeddings and normalize again, all on the device
+            avg_embedding = F.normalize(frame_features.mean(dim=0, keepdim=True), dim=-1)
+        return avg_embedding.squeeze(0).float().cpu().numpy()
+    
+    @staticmethod
+    def _sample_frame_indices(total_frames: int, num_frames: int) -> np.ndarray:
+        """
+        Choose which frames to sample from a video.
+        
+        Args:
+            total_frames: Number of frames in the video
+            num_frames: Number of frames to sample
+            
+        Returns:
+            Sorted array of frame indices
+        """
+        if num_frames >= total_frames:
+            return np.arange(0, total_frames)
+        
+        # Sample frames throughout the video with more focus on the beginning (videos often
+        # have most relevant content in the first half): warping an even spacing by
+        # FRAME_SAMPLING_BIAS puts ~60% of the samples in the first half.
+        # np.unique keeps the indices strictly increasing for sequential decoding.
+        t = np.linspace(0, 1, num_frames) ** FRAME_SAMPLING_BIAS
+        return np.unique((t * (total_frames - 1)).astype(np.int64))
+    
+    def _load_video_keyframes_av(self, video_path: str, num_frames: int) -> Optional[torch.Tensor]:
+        """
+        Decode keyframes near the sampled positions with PyAV and preprocess them as one batch.
+        
+        Each sample seeks to the preceding keyframe and the decoder skips non-key frames,
+        so only num_frames frames are decoded regardless of video length or GOP size.
+        Keyframes are scene-representative, which is what semantic search needs.
+        
+        Args:
+            video_path: Path to the video file
+            num_frames: Number of frames to sample
+            
+        Returns:
+            Preprocessed (N, 3, H, W) tensor on the target device, or None if no frames were decoded
+        """
+        with av.open(video_path) as container:
+            stream = container.streams.video[0]
+            stream.codec_context.skip_frame = "NONKEY"
+            
+            if stream.duration is not None:
+                duration = int(stream.duration)
+            elif container.duration is not None:
+                duration = int(container.duration / av.time_base / stream.time_base)
             else:
-                frame_indices = np.arange(0, total_frames)
+                return None
             
-            for idx in frame_indices:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-                ret, frame = cap.read()
-                if ret:
-                    # Convert BGR to RGB
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    image = Image.fromarray(frame_rgb)
-                    image_tensor = self.clip_preprocess(image).unsqueeze(0).to(device)
-                    
-                    with torch.no_grad():
-                        frame_features = self.clip_model.encode_image(image_tensor)
-                        frame_features = frame_features / frame_features.norm(dim=-1, keepdim=True)
-                        frame_embeddings.append(frame_features.cpu().numpy())
+            start = stream.start_time or 0
+            targets = self._sample_frame_indices(max(duration, 1), num_frames) + start
             
+            frames = []
+            seen_pts = set()
+            for target in targets.tolist():
+                container.seek(target, backward=True, any_frame=False, stream=stream)
+                frame = next(container.decode(stream), None)
+                # Nearby samples often land on the same keyframe
+                if frame is None or frame.pts in seen_pts:
+                    continue
+                seen_pts.add(frame.pts)
+                frames.append(torch.from_numpy(frame.to_ndarray(format='rgb24')))
+        
+        if not frames:
+            return None
+        
+        frames = _to_device(torch.stack(frames).permute(0, 3, 1, 2))
+        return self.gpu_preprocess(frames)
+    
+    def _load_video_frames_decord(self, video_path: str, num_frames: int) -> Optional[torch.Tensor]:
+        """
+        Decode sampled frames with Decord and preprocess them as one batch.
+        
+        Decord fetches all sampled frames in a single get_batch call and returns RGB
+        directly, so no per-frame seek or color conversion is needed.
+        
+        Args:
+            video_path: Path to the video file
+            num_frames: Number of frames to sample
+            
+        Returns:
+            Preprocessed (N, 3, H, W) tensor on the target device, or None if no frames were decoded
+        """
+        reader = decord.VideoReader(video_path, ctx=decord.cpu(0))
+        total_frames = len(reader)
+        if total_frames == 0:
+            return None
+        
+        frame_indices = self._sample_frame_indices(total_frames, num_frames)
+        frames = reader.get_batch(frame_indices.tolist()).asnumpy()
+        frames = _to_device(torch.from_numpy(frames).permute(0, 3, 1, 2))
+        return self.gpu_preprocess(frames)
+    
+    def _load_video_frames_cv2(self, video_path: str, num_frames: int) -> Optional[torch.Tensor]:
+        """
+        Decode sampled frames with OpenCV and preprocess them.
+        
+        Args:
+            video_path: Path to the video file
+            num_frames: Number of frames to sample
+            
+        Returns:
+            Preprocessed (N, 3, H, W) view of the staging buffer, or None if no frames were decoded
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return None
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total_frames == 0:
             cap.release()
+            return None
+        
+        frame_indices = self._sample_frame_indices(total_frames, num_frames)
+        
+        # Preprocessed frames are written into the preallocated staging buffer
+        if len(frame_indices) <= self._video_batch_buf.shape[0]:
+            frame_buf = self._video_batch_buf
+        else:
+            frame_buf = torch.empty(
+                (len(frame_indices),) + self._video_batch_buf.shape[1:],
+                device=device, dtype=self._video_batch_buf.dtype
+            )
+        frame_count = 0
+        
+        # Decode on a reader thread while this thread preprocesses, so the device
+        # doesn't sit idle waiting on the decoder
+        frame_queue = queue.Queue(maxsize=VIDEO_FRAME_PREFETCH)
+        stop_reading = threading.Event()
+        reader = threading.Thread(
+            target=self._read_frames,
+            args=(cap, frame_indices, frame_queue, stop_reading),
+            daemon=True
+        )
+        reader.start()
+        
+        frame = None
+        try:
+            while True:
+                frame = frame_queue.get()
+                if frame is None:
+                    break
+                # Convert BGR to RGB and preprocess on the device, skipping PIL
+                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                frame_tensor = _to_device(torch.from_numpy(frame_rgb).permute(2, 0, 1))
+                frame_buf[frame_count].copy_(self.gpu_preprocess(frame_tensor), non_blocking=True)
+                frame_count += 1
+        finally:
+            # On error, unblock the reader and wait for its sentinel before releasing
+            stop_reading.set()
+            while frame is not None:
+                frame = frame_queue.get()
+            reader.join()
+            cap.release()
+        
+        if frame_count == 0:
+            return None
+        
+        return frame_buf[:frame_count]
+    
+    @staticmethod
+    def _read_frames(cap, frame_indices, frame_queue: queue.Queue, stop_event: threading.Event):
+        """
+        Decode the requested frames sequentially and put them on a queue.
+        
+        Frames are grabbed in order and only retrieved at the target indices, which is
+        much cheaper than seeking (each seek flushes the decoder back to a keyframe).
+        A None sentinel is put on the queue once decoding is finished.
+        
+        Args:
+            cap: Opened cv2.VideoCapture
+            frame_indices: Frame indices to retrieve
+            frame_queue: Queue receiving decoded BGR frames
+            stop_event: Set by the consumer to stop decoding early
+        """
+        try:
+            targets = iter(sorted(set(int(idx) for idx in frame_indices)))
+            next_target = next(targets, None)
+            position = 0
             
-            if frame_embeddings:
-                # Average the frame embeddings
-                avg_embedding = np.mean(frame_embeddings, axis=0).flatten()
-                # Normalize again
-                avg_embedding = avg_embedding / np.linalg.norm(avg_embedding)
-                return avg_embedding
-            else:
-                return np.zeros(self.embedding_dim)
-                
-        except Exception as e:
-            print(f"Error processing video {video_path}: {e}")
-            return np.zeros(512)
+            while next_target is not None and not stop_event.is_set():
+                if not cap.grab():
+                    break
+                if position == next_target:
+                    ret, frame = cap.retrieve()
+                    if ret:
+                        frame_queue.put(frame)
+                    next_target = next(targets, None)
+                position += 1
+        finally:
+            frame_queue.put(None)
+    
+    def _encode_category_features(self, categories: Tuple[str, ...]) -> torch.Tensor:
+        """
+        Encode category labels with CLIP's text encoder.
+        
+        Args:
+            categories: Category labels to encode
+            
+        Returns:
+            Normalized text features on the target device
+        """
+        text_tokens = clip.tokenize(list(categories)).to(device)
+        with torch.inference_mode():
+            text_features = self._encode_text(text_tokens)
+            text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+        return text_features
     
     def generate_categories(self, image_path: str, candidate_categories: List[str] = None) -> List[Tuple[str, float]]:
         """
@@ -145,116 +770,232 @@ class MediaAnalyzer:
             List of (category, score) tuples sorted by score
         """
         if candidate_categories is None:
-            candidate_categories = [
-                "a person drawing", "a person painting", "a person cooking",
-                "a person eating", "a person exercising", "a person working",
-                "a person reading", "a person sleeping", "a person talking",
-                "outdoor scene", "indoor scene", "nature", "city", "beach",
-                "party", "celebration", "family", "friends", "pets", "animals"
-            ]
+            candidate_categories = DEFAULT_CATEGORIES
         
         try:
-            image = Image.open(image_path).convert('RGB')
-            image_tensor = self.clip_preprocess(image).unsqueeze(0).to(device)
-            
-            # Tokenize categories
-            text_tokens = clip.tokenize(candidate_categories).to(device)
-            
-            with torch.no_grad():
-                image_features = self.clip_model.encode_image(image_tensor)
-                text_features = self.clip_model.encode_text(text_tokens)
-                
-                # Normalize
-                image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-                text_features = text_features / text_features.norm(dim=-1, keepdim=True)
-                
-                # Compute similarity
-                similarity = (100.0 * image_features @ text_features.T).softmax(dim=-1)
-            
-            # Get top categories
-            scores = similarity.cpu().numpy().flatten()
-            category_scores = list(zip(candidate_categories, scores))
-            category_scores.sort(key=lambda x: x[1], reverse=True)
-            
-            return category_scores[:5]  # Return top 5
-            
+            image_features = self._image_features(image_path)
+            return self._score_categories(image_features, candidate_categories)
         except Exception as e:
             print(f"Error categorizing {image_path}: {e}")
             return []
     
+    def _score_categories(self, image_features: torch.Tensor, candidate_categories: List[str]) -> List[Tuple[str, float]]:
+        """
+        Score category labels against normalized image features.
+        
+        Args:
+            image_features: Normalized (1, D) image features
+            candidate_categories: List of category labels to score
+            
+        Returns:
+            Top 5 (category, score) tuples sorted by score
+        """
+        # Text features are cached per category list, so only the image is encoded per call
+        if candidate_categories is DEFAULT_CATEGORIES:
+            text_features = self._default_cat_feats
+        else:
+            text_features = self._encode_categories(tuple(candidate_categories))
+        
+        with torch.inference_mode():
+            # Compute similarity (softmax in FP32 for numerical stability)
+            similarity = (100.0 * image_features @ text_features.T).float().softmax(dim=-1)
+            
+            # Select the top 5 on the device so only those scores are transferred
+            scores, indices = similarity.topk(min(5, len(candidate_categories)), dim=-1)
+        
+        scores = scores.squeeze(0).cpu().tolist()
+        indices = indices.squeeze(0).cpu().tolist()
+        return [(candidate_categories[i], score) for i, score in zip(indices, scores)]
+    
     def encode_text_query(self, query: str, expand_query: bool = True) -> np.ndarray:
         """
         Encode a text query into an embedding for search.
         
+        Results are cached per normalized query, so repeated searches skip the text encoder.
+        
         Args:
             query: Natural language search query
-            expand_query: Whether to expand query with related terms for better matching
+            expand_query: Accepted for compatibility; queries are encoded as given
             
         Returns:
-            Embedding vector
+            Embedding vector (read-only, shared between calls with the same query)
         """
-        # Query expansion for better matching
-        if expand_query:
-            query = self._expand_query(query)
-        
-        # Use CLIP's text encoder for better alignment with image embeddings
+        # CLIP's tokenizer lowercases and collapses whitespace, so these queries encode identically
+        query = query.strip().lower()
         try:
-            # Try multiple query formulations and average them for better accuracy
-            query_variations = [
-                query,  # Original
-                f"a photo of {query}",  # Photo description
-                f"a video of {query}",  # Video description
-                f"an image showing {query}",  # Image description
-            ]
+            return self._encode_query_cached(query)
+        except Exception as e:
+            print(f"Error encoding query: {e}")
+            # Fallback to sentence transformer; not cached, so the next search retries CLIP
+            return self.text_model.encode(query)
+    
+    def encode_text_queries(self, queries: List[str], expand_query: bool = True) -> List[np.ndarray]:
+        """
+        Encode several text queries with a single text-encoder pass.
+        
+        Every query is tokenized into its QUERY_TEMPLATES formulations and all of them are
+        encoded together; CLIP pads every prompt to its fixed context length, so queries
+        of different lengths batch without extra padding. Falls back to encoding the
+        queries one by one if the batched pass fails.
+        
+        Args:
+            queries: Natural language search queries
+            expand_query: Accepted for compatibility; queries are encoded as given
             
-            text_tokens = clip.tokenize(query_variations).to(device)
-            with torch.no_grad():
-                text_features = self.clip_model.encode_text(text_tokens)
+        Returns:
+            Read-only embedding vectors in queries order
+        """
+        if len(queries) == 1:
+            return [self.encode_text_query(queries[0], expand_query)]
+        
+        texts = [query.strip().lower() for query in queries]
+        
+        try:
+            text_tokens = torch.cat([self._tokenize_query(text) for text in texts]).to(device)
+            with torch.inference_mode():
+                text_features = self._encode_text(text_tokens)
                 text_features = text_features / text_features.norm(dim=-1, keepdim=True)
-                # Average the query variations for more robust matching
-                avg_features = text_features.mean(dim=0, keepdim=True)
+                # Average each query's template variations, as in encode_text_query
+                avg_features = text_features.reshape(len(texts), len(self._template_ids), -1).mean(dim=1)
                 avg_features = avg_features / avg_features.norm(dim=-1, keepdim=True)
-            return avg_features.cpu().numpy().flatten()
+            embeddings = list(avg_features.float().cpu().numpy())
         except Exception as e:
-            print(f"Error encoding query: {e}")
-            # Fallback to sentence transformer
-            return self.text_model.encode(query)
+            print(f"Error encoding query batch, encoding one at a time: {e}")
+            return [self.encode_text_query(query, expand_query) for query in queries]
+        
+        for embedding in embeddings:
+            embedding.setflags(write=False)
+        return embeddings
     
-    def _expand_query(self, query: str) -> str:
+    def _encode_text_query_uncached(self, query: str) -> np.ndarray:
+        """Encode a normalized text query; wrapped by the per-instance query cache."""
+        embedding = self._encode_text_query(query)
+        embedding.setflags(write=False)
+        return embedding
+    
+    def _encode_text_query(self, query: str) -> np.ndarray:
+        """Run the CLIP text encoder; raises if CLIP fails."""
+        # Use CLIP's text encoder for better alignment with image embeddings
+        # Try multiple query formulations and average them for better accuracy
+        text_tokens = self._tokenize_query(query).to(device)
+        with torch.inference_mode():
+            text_features = self._encode_text(text_tokens)
+            text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+            # Average the query variations for more robust matching
+            avg_features = text_features.mean(dim=0, keepdim=True)
+            avg_features = avg_features / avg_features.norm(dim=-1, keepdim=True)
+        return avg_features.float().cpu().numpy().flatten()
+    
+    def _tokenize_query(self, query: str) -> torch.Tensor:
         """
-        Expand query with related terms for better matching.
+        Tokenize a query into every QUERY_TEMPLATES formulation.
+        
+        Template tokens are precomputed at init, so the query itself is BPE-encoded only
+        once and spliced between them. CLIP's tokenizer splits on whitespace before BPE,
+        so this matches clip.tokenize on the formatted strings.
         
         Args:
-            query: Original search query
+            query: Search query
             
         Returns:
-            Expanded query string
-        """
-        # Simple keyword expansion based on common patterns
-        expansions = {
-            "drawing": ["drawing", "sketching", "art", "illustration"],
-            "cooking": ["cooking", "baking", "preparing food"],
-            "eating": ["eating", "dining", "meal", "food"],
-            "exercising": ["exercising", "working out", "fitness", "sports"],
-            "reading": ["reading", "book", "study"],
-            "sleeping": ["sleeping", "rest", "bed"],
-            "talking": ["talking", "speaking", "conversation", "chatting"],
-            "outdoor": ["outdoor", "outside", "nature", "park", "garden"],
-            "indoor": ["indoor", "inside", "home", "room"],
-            "dog": ["dog", "puppy", "canine", "pet"],
-            "cat": ["cat", "kitten", "feline", "pet"],
-        }
-        
-        query_lower = query.lower()
-        expanded_terms = [query]
-        
-        # Check for keywords and add expansions
-        for key, terms in expansions.items():
-            if key in query_lower:
-                expanded_terms.extend(terms)
-                break
-        
-        # Return original query with context (CLIP works better with natural language)
-        return query
+            (len(QUERY_TEMPLATES), context_length) token tensor
+        """
+        query_ids = self._tokenizer.encode(query)
+        context_length = self.clip_model.context_length
+        tokens = torch.zeros(len(self._template_ids), context_length, dtype=torch.long)
+        
+        for i, (prefix_ids, suffix_ids) in enumerate(self._template_ids):
+            ids = [self._sot_token] + prefix_ids + query_ids + suffix_ids
+            # Truncate overly long queries but always end with the end-of-text token
+            ids = ids[:context_length - 1] + [self._eot_token]
+            tokens[i, :len(ids)] = torch.tensor(ids)
+        
+        return tokens
 
 
+def _open_rgb(image_path: str, size: int) -> Image.Image:
+    """
+    Open an image as RGB, letting JPEGs decode at reduced size.
+    
+    draft() makes libjpeg scale by 1/2, 1/4 or 1/8 during the DCT while keeping both
+    sides at least `size`, so multi-megapixel photos are never fully decoded just to be
+    resized. It is a no-op for other formats.
+    
+    Args:
+        image_path: Path to the image file
+        size: Smallest side needed downstream
+        
+    Returns:
+        RGB PIL image
+    """
+    image = Image.open(image_path)
+    image.draft('RGB', (size, size))
+    return image.convert('RGB')
+
+
+def _resize_center_crop(image: Image.Image, size: int) -> Image.Image:
+    """Resize the shorter side to `size` (bicubic) and center-crop to a size x size square."""
+    scale = size / min(image.size)
+    new_size = (max(size, round(image.width * scale)), max(size, round(image.height * scale)))
+    image = image.resize(new_size, Image.BICUBIC)
+    left = (image.width - size) // 2
+    top = (image.height - size) // 2
+    return image.crop((left, top, left + size, top + size))
+
+
+def preprocess_image_file(image_path: str, size: int = 224) -> np.ndarray:
+    """
+    Decode, resize and center-crop an image to the model input size on the CPU.
+    
+    Runs on decode worker threads (PIL releases the GIL while decoding and resizing);
+    the returned model-sized array takes the fast normalize-only path in
+    MediaAnalyzer._preprocess_image.
+    
+    Args:
+        image_path: Path to the image file
+        size: Target resolution (MediaAnalyzer.input_resolution)
+        
+    Returns:
+        (3, size, size) uint8 RGB array
+    """
+    image = _open_rgb(image_path, size)
+    return np.ascontiguousarray(np.asarray(_resize_center_crop(image, size)).transpose(2, 0, 1))
+
+
+def resize_cache(image_paths: List[str], cache_dir: str, size: int = 224) -> Dict[str, str]:
+    """
+    Write model-sized copies of images so later indexing runs skip the resize step.
+    
+    Images are resized (shorter side to `size`, bicubic) and center-cropped the same way
+    clip_preprocess does, then saved as PNG. Only plain resize/crop/save operations are used
+    so the work is accelerated when Pillow-SIMD is installed as a drop-in replacement for Pillow.
+    Useful for fixed datasets that are indexed more than once.
+    
+    Args:
+        image_paths: Paths of the images to cache
+        cache_dir: Directory where the resized PNGs are written
+        size: Target resolution (224 for the ViT-B models)
+        
+    Returns:
+        Dictionary mapping original image paths to cached PNG paths
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = {}
+    
+    for image_path in image_paths:
+        # Key by a stable hash of the path so same-named files in different folders don't collide
+        name = os.path.splitext(os.path.basename(image_path))[0]
+        path_hash = hashlib.md5(image_path.encode('utf-8')).hexdigest()[:8]
+        cache_path = os.path.join(cache_dir, f"{name}_{path_hash}.png")
+        
+        if not os.path.exists(cache_path):
+            try:
+                image = _open_rgb(image_path, size)
+                _resize_center_crop(image, size).save(cache_path)
+            except Exception as e:
+                print(f"Error caching image {image_path}: {e}")
+                continue
+        
+        cached[image_path] = cache_path
+    
+    return cached
@@ -0,0 +1,139 @@
+"""
+Embedding cache module for reusing embeddings of files that were already analyzed.
+"""
+import os
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from typing import Optional
+
+# xxHash is optional: it hashes several times faster than BLAKE2
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Files up to this size are hashed in full; larger ones (mostly videos) are sampled
+FULL_HASH_MAX_SIZE = 4 * 1024 * 1024
+
+# Bytes read from the start, middle and end of a sampled file
+SAMPLE_SIZE = 1024 * 1024
+
+# Pending writes are committed in one transaction once this many accumulate
+FLUSH_SIZE = 256
+
+
+class EmbeddingCache:
+    """Persistent map from file content hash to embedding, backed by SQLite."""
+    
+    def __init__(self, cache_path: str, namespace: str = ""):
+        """
+        Open (or create) the cache.
+        
+        Args:
+            cache_path: Path of the SQLite database file
+            namespace: Model identifier mixed into every key, so embeddings from
+                different models never mix
+        """
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._pending = {}
+        
+        # Shared by the indexing producer and consumer threads, serialized by the lock
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, embedding BLOB NOT NULL)"
+        )
+        self._conn.commit()
+    
+    def file_key(self, file_path: str) -> str:
+        """
+        Hash a file's contents into a cache key.
+        
+        Small files are hashed in full. Larger files hash their size plus 1 MiB samples
+        from the start, middle and end, which identifies copies without reading whole videos.
+        
+        Args:
+            file_path: Path to the media file
+        
+        Returns:
+            Hex digest identifying the file contents
+        """
+        hasher = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+        hasher.update(self.namespace.encode('utf-8'))
+        
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            hasher.update(size.to_bytes(8, 'little'))
+            if size <= FULL_HASH_MAX_SIZE:
+                hasher.update(f.read())
+            else:
+                for offset in (0, (size - SAMPLE_SIZE) // 2, size - SAMPLE_SIZE):
+                    f.seek(offset)
+                    hasher.update(f.read(SAMPLE_SIZE))
+        
+        return hasher.hexdigest()
+    
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Look up a cached embedding.
+        
+        Args:
+            key: Key from file_key
+        
+        Returns:
+            Read-only float32 embedding, or None if not cached
+        """
+        with self._lock:
+            embedding = self._pending.get(key)
+            if embedding is not None:
+                return embedding
+            row = self._conn.execute("SELECT embedding FROM embeddings WHERE key = ?", (key,)).fetchone()
+        
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32)
+    
+    def put(self, key: str, embedding: np.ndarray):
+        """
+        Store an embedding; writes are committed in batches.
+        
+        Args:
+            key: Key from file_key
+            embedding: Embedding vector (all-zero failure placeholders are not cached)
+        """
+        if embedding is None or not np.any(embedding):
+            return
+        
+        embedding = np.ascontiguousarray(embedding, dtype=np.float32).reshape(-1)
+        with self._lock:
+            self._pending[key] = embedding
+            if len(self._pending) >= FLUSH_SIZE:
+                self._flush_locked()
+    
+    def flush(self):
+        """Commit pending writes."""
+        with self._lock:
+            self._flush_locked()
+    
+    def _flush_locked(self):
+        """Commit pending writes; the caller holds the lock."""
+        if not self._pending:
+            return
+        try:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+                [(key, embedding.tobytes()) for key, embedding in self._pending.items()]
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error writing embedding cache: {e}")
+        self._pending.clear()
+    
+    def close(self):
+        """Commit pending writes and close the database."""
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
@@ -5,13 +5,25 @@ import customtkinter as ctk
 from tkinter import filedialog, messagebox
 import threading
 import os
-from pathlib import Path
+import atexit
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 import tkinter.scrolledtext as scrolledtext
 
-from media_organizer import organize_media, IMAGE_EXTENSIONS, VIDEO_EXTENSIONS
-from ai_analyzer import MediaAnalyzer
-from search_index import MediaSearchIndex
+# ai_analyzer (torch, CLIP) and search_index (faiss) are imported where first used, so
+# the window opens without waiting for them
+from media_organizer import organize_media, iter_media, ALL_EXTENSIONS
+
+# Background jobs share this many app-owned threads: organizing, indexing, a search and
+# loading the index
+APP_WORKERS = 4
+
+# How often queued log messages are written to the log widgets
+LOG_FLUSH_INTERVAL_MS = 150
+
+# Lines kept in each log widget; older lines are dropped so appends stay cheap
+LOG_MAX_LINES = 2000
 
 # Set appearance mode and color theme
 ctk.set_appearance_mode("dark")  # "light" or "dark"
@@ -28,6 +40,8 @@ class PHAIApp:
         
         # Initialize components
         self.analyzer = None
+        self._analyzer_lock = threading.Lock()
+        self._analyzer_future = Future()
         self.search_index = None
         self.index_path = "./data/index"
         self.organized_media_path = "./organized_media"
@@ -37,13 +51,26 @@ class PHAIApp:
         self.index_stop_flag = threading.Event()
         self.add_to_index_stop_flag = threading.Event()
         
-        # Progress animation flags
-        self.organize_progress_animating = False
-        self.index_progress_animating = False
+        # Background jobs run on one app-owned pool; the futures track what is running
+        self._executor = ThreadPoolExecutor(max_workers=APP_WORKERS, thread_name_prefix='phai')
+        self._tasks = {}
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        atexit.register(self._shutdown)
+        
+        # Log messages and progress fractions from worker threads, drained into the
+        # log widgets and progress bars on a Tk timer
+        self._log_queues = {"organize": deque(), "index": deque()}
+        self._progress_fracs = {"organize": 0.0, "index": 0.0}
         
         # Create UI
         self.create_widgets()
+        self._log_widgets = {"organize": self.organize_log, "index": self.index_log}
+        self._progress_bars = {"organize": self.organize_progress, "index": self.index_progress}
+        self._flush_logs()
         
+        # Load the AI models in the background so the first indexing run doesn't wait for them
+        threading.Thread(target=self._warmup_analyzer, daemon=True).start()
+        # Load the existing index (faiss import and file reads) off the Tk thread
         # Try to load existing index
         self.load_index()
     
@@ -154,11 +181,18 @@ class PHAIApp:
         # Log
         ctk.CTkLabel(main_frame, text="Activity Log:", 
                     font=ctk.CTkFont(size=14, weight="bold")).pack(anchor="w", pady=(10, 5))
-        self.organize_log = scrolledtext.ScrolledText(main_frame, height=15, width=80, 
-                                                      font=('Courier', 10), wrap="word",
+        organize_log_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        organize_log_frame.pack(fill="both", expand=True, pady=5)
+        organize_log_xscroll = ctk.CTkScrollbar(organize_log_frame, orientation="horizontal")
+        organize_log_xscroll.pack(side="bottom", fill="x")
+        self.organize_log = scrolledtext.ScrolledText(organize_log_frame, height=15, width=80, 
+                                                      font=('Courier', 10), wrap="none",
                                                       bg="#1e1e1e", fg="#d4d4d4", 
-                                                      insertbackground="#ffffff")
-        self.organize_log.pack(fill="both", expand=True, pady=5)
+                                                      insertbackground="#ffffff",
+                                                      undo=False, autoseparators=False, maxundo=0)
+        self.organize_log.pack(fill="both", expand=True)
+        self.organize_log.configure(xscrollcommand=organize_log_xscroll.set)
+        organize_log_xscroll.configure(command=self.organize_log.xview)
     
     def create_index_tab(self):
         """Create the index media tab."""
@@ -197,6 +231,15 @@ class PHAIApp:
         ctk.CTkButton(index_path_frame, text="Browse...", command=self.select_index_path, 
                      width=100).pack(side="left", padx=5, pady=10)
         
+        # Options
+        self.reindex_all_var = ctk.BooleanVar(value=False)
+        
+        index_options_frame = ctk.CTkFrame(main_frame)
+        index_options_frame.pack(fill="x", pady=10)
+        
+        ctk.CTkCheckBox(index_options_frame, text="Re-index all (rebuild from scratch)", 
+                       variable=self.reindex_all_var).pack(side="left", padx=20, pady=10)
+        
         # Buttons
         btn_frame = ctk.CTkFrame(main_frame)
         btn_frame.pack(fill="x", pady=20)
@@ -237,11 +280,18 @@ class PHAIApp:
         # Log
         ctk.CTkLabel(main_frame, text="Activity Log:", 
                     font=ctk.CTkFont(size=14, weight="bold")).pack(anchor="w", pady=(10, 5))
-        self.index_log = scrolledtext.ScrolledText(main_frame, height=12, width=80, 
-                                                   font=('Courier', 10), wrap="word",
+        index_log_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        index_log_frame.pack(fill="both", expand=True, pady=5)
+        index_log_xscroll = ctk.CTkScrollbar(index_log_frame, orientation="horizontal")
+        index_log_xscroll.pack(side="bottom", fill="x")
+        self.index_log = scrolledtext.ScrolledText(index_log_frame, height=12, width=80, 
+                                                   font=('Courier', 10), wrap="none",
                                                    bg="#1e1e1e", fg="#d4d4d4",
-                                                   insertbackground="#ffffff")
-        self.index_log.pack(fill="both", expand=True, pady=5)
+                                                   insertbackground="#ffffff",
+                                                   undo=False, autoseparators=False, maxundo=0)
+        self.index_log.pack(fill="both", expand=True)
+        self.index_log.configure(xscrollcommand=index_log_xscroll.set)
+        index_log_xscroll.configure(command=self.index_log.xview)
         
         # Stats
         self.stats_label = ctk.CTkLabel(main_frame, text="", 
@@ -271,9 +321,11 @@ class PHAIApp:
         search_entry.pack(side="left", fill="x", expand=True, padx=5, pady=10)
         search_entry.bind('<Return>', lambda e: self.search_media())
         
-        ctk.CTkButton(search_frame, text="🔍 Search", command=self.search_media,
-                     font=ctk.CTkFont(size=14, weight="bold"),
-                     height=40, fg_color="#1f77b4", hover_color="#1565a0").pack(side="left", padx=5, pady=10)
+        # Enabled once the index has been loaded in the background
+        self.search_btn = ctk.CTkButton(search_frame, text="🔍 Search", command=self.search_media,
+                                        font=ctk.CTkFont(size=14, weight="bold"), state="disabled",
+                                        height=40, fg_color="#1f77b4", hover_color="#1565a0")
+        self.search_btn.pack(side="left", padx=5, pady=10)
         
         # Results frame
         results_frame = ctk.CTkFrame(main_frame)
@@ -355,414 +407,459 @@ For help, see the README.md file."""
         if folder:
             self.index_path_var.set(folder)
     
+    # Analyzer
+    def _warmup_analyzer(self):
+        """Build the analyzer on a background thread and publish it through the analyzer future."""
+        try:
+            from ai_analyzer import MediaAnalyzer
+            
+            # MediaAnalyzer compiles its encoders and runs a dummy forward pass while loading
+            analyzer = MediaAnalyzer()
+        except Exception as e:
+            print(f"Error loading AI models: {e}")
+            self._analyzer_future.set_exception(e)
+            return
+        
+        with self._analyzer_lock:
+            self.analyzer = analyzer
+        self._analyzer_future.set_result(analyzer)
+    
+    def _get_analyzer(self):
+        """
+        Wait for the warmed-up analyzer, restarting the warm-up if it failed.
+        
+        Returns:
+            MediaAnalyzer instance
+        """
+        with self._analyzer_lock:
+            future = self._analyzer_future
+            if future.done() and future.exception() is not None:
+                future = self._analyzer_future = Future()
+                threading.Thread(target=self._warmup_analyzer, daemon=True).start()
+        return future.result()
+    
+    # Logging
+    def _log(self, name, message):
+        """Queue a log message from any thread; it is shown on the next flush."""
+        self._log_queues[name].append(message)
+    
+    def _set_progress(self, name, frac):
+        """Record progress (0.0-1.0) from any thread; the bar is updated on the next flush."""
+        self._progress_fracs[name] = frac
+    
+    def _flush_logs(self):
+        """Drain queued log messages into their widgets with one insert each, update progress bars, then reschedule."""
+        for name, frac in self._progress_fracs.items():
+            bar = self._progress_bars[name]
+            if bar.get() != frac:
+                bar.set(frac)
+        
+        for name, messages in self._log_queues.items():
+            if not messages:
+                continue
+            chunks = []
+            while messages:
+                chunks.append(messages.popleft())
+            widget = self._log_widgets[name]
+            widget.insert("end", "".join(chunks))
+            if int(widget.index("end-1c").split('.')[0]) > LOG_MAX_LINES:
+                widget.delete("1.0", f"end-{LOG_MAX_LINES} lines")
+            widget.see("end")
+        self.root.after(LOG_FLUSH_INTERVAL_MS, self._flush_logs)
+    
+    # Background tasks
+    def _task_running(self, *names):
+        """Check whether any of the named background tasks is still running."""
+        return any(name in self._tasks and not self._tasks[name].done() for name in names)
+    
+    def _submit(self, name, fn):
+        """Run fn on the app's worker pool, tracking it under name."""
+        self._tasks[name] = self._executor.submit(fn)
+    
+    def _cancel(self, *names):
+        """Cancel named tasks that haven't started yet; running ones watch their stop flag."""
+        for name in names:
+            if name in self._tasks:
+                self._tasks[name].cancel()
+    
+    def _shutdown(self):
+        """Signal every job to stop and release the worker pool without waiting."""
+        self.organize_stop_flag.set()
+        self.index_stop_flag.set()
+        self.add_to_index_stop_flag.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _on_close(self):
+        """Stop background jobs before closing the window."""
+        self._shutdown()
+        self.root.destroy()
+    
     # Stop methods
     def stop_organize(self):
-        """Stop organizing operation."""
+        """Stop organizing operation, including the automatic indexing that follows it."""
         self.organize_stop_flag.set()
-        self.organize_log.insert("end", "\n⚠ Operation stopped by user.\n")
-        self.organize_log.see("end")
+        # The auto-index stage watches the indexing stop flag
+        if self._task_running("auto_index"):
+            self.index_stop_flag.set()
+        self._cancel("organize", "auto_index")
+        self._log("organize", "\n⚠ Operation stopped by user.\n")
     
     def stop_index(self):
         """Stop indexing operation."""
         self.index_stop_flag.set()
-        self.index_log.insert("end", "\n⚠ Operation stopped by user.\n")
-        self.index_log.see("end")
+        self._cancel("index")
+        self._log("index", "\n⚠ Operation stopped by user.\n")
     
     def stop_add_to_index(self):
         """Stop add to index operation."""
         self.add_to_index_stop_flag.set()
-        self.index_log.insert("end", "\n⚠ Operation stopped by user.\n")
-        self.index_log.see("end")
+        self._cancel("index")
+        self._log("index", "\n⚠ Operation stopped by user.\n")
     
     # Action methods
     def organize_media(self):
         """Organize media files."""
-        source = self.source_folder_var.get()
-        dest = self.dest_folder_var.get()
-        
-        if not source or not os.path.exists(source):
-            messagebox.showerror("Error", "Please select a valid source folder")
+        if self._task_running("organize", "auto_index"):
             return
         
-        if not dest:
-            messagebox.showerror("Error", "Please select a destination folder")
-            return
+        source = self.source_folder_var.get()
+        dest = self.dest_folder_var.get()
         
         # Reset stop flag
         self.organize_stop_flag.clear()
         
         self.organize_btn.configure(state="disabled")
         self.organize_stop_btn.configure(state="normal")
-        self.organize_progress.set(0)
-        self.start_progress_animation("organize")
+        self._set_progress("organize", 0.0)
+        self._log_queues["organize"].clear()
         self.organize_log.delete(1.0, "end")
         self.organize_log.insert("end", f"🚀 Starting organization...\n")
         self.organize_log.insert("end", f"📂 Source: {source}\n")
         self.organize_log.insert("end", f"📁 Destination: {dest}\n\n")
         
         def organize_thread():
+            auto_indexing = False
             try:
+                # Validated here rather than on the UI thread: exists() can block on network shares
+                if not source or not os.path.isdir(source):
+                    self._log("organize", "❌ Please select a valid source folder\n")
+                    return
+                
+                if not dest:
+                    self._log("organize", "❌ Please select a destination folder\n")
+                    return
+                
                 organized = organize_media(
                     source_dir=source,
                     dest_dir=dest,
-                    copy_files=not self.move_files_var.get()
+                    copy_files=not self.move_files_var.get(),
+                    stop_event=self.organize_stop_flag,
+                    progress=lambda done, total: self._set_progress("organize", done / total)
                 )
                 
                 if not self.organize_stop_flag.is_set():
-                    self.root.after(0, lambda: self.organize_log.insert(
-                        "end", f"\n✅ Successfully organized {len(organized)} files!\n"
-                    ))
+                    self._log("organize", f"\n✅ Successfully organized {len(organized)} files!\n")
                     
                     # Auto-index if enabled
                     if self.auto_index_var.get() and len(organized) > 0:
-                        self.root.after(0, lambda: self.organize_log.insert(
-                            "end", f"\n🔍 Starting automatic indexing...\n"
-                        ))
+                        self._log("organize", f"\n🔍 Starting automatic indexing...\n")
+                        auto_indexing = True
                         self.root.after(0, lambda: self.auto_index_after_organize(dest))
             except Exception as e:
                 if not self.organize_stop_flag.is_set():
-                    self.root.after(0, lambda: self.organize_log.insert(
-                        "end", f"\n❌ Error: {str(e)}\n"
-                    ))
+                    self._log("organize", f"\n❌ Error: {str(e)}\n")
             finally:
-                if not self.auto_index_var.get() or self.organize_stop_flag.is_set():
+                if not auto_indexing:
                     self.root.after(0, lambda: (
-                        self.stop_progress_animation("organize"),
+                        self._set_progress("organize", 1.0),
                         self.organize_btn.configure(state="normal"),
                         self.organize_stop_btn.configure(state="disabled")
                     ))
         
-        threading.Thread(target=organize_thread, daemon=True).start()
+        self._submit("organize", organize_thread)
     
     def auto_index_after_organize(self, media_dir):
         """Automatically index files after organizing."""
+        if self.organize_stop_flag.is_set():
+            self._set_progress("organize", 1.0)
+            self.organize_btn.configure(state="normal")
+            self.organize_stop_btn.configure(state="disabled")
+            return
+        
+        if self._task_running("index"):
+            self._log("organize", "⚠ Indexing is already running; skipped automatic indexing.\n")
+            self._set_progress("organize", 1.0)
+            self.organize_btn.configure(state="normal")
+            self.organize_stop_btn.configure(state="disabled")
+            return
+        
         index_path = self.index_path_var.get()
         self.index_folder_var.set(media_dir)
         self.index_stop_flag.clear()
+        reindex_all = self.reindex_all_var.get()
         
-        self.organize_log.insert("end", f"📂 Indexing folder: {media_dir}\n")
-        self.organize_log.see("end")
+        self._log("organize", f"📂 Indexing folder: {media_dir}\n")
+        # The organize bar now follows indexing progress
+        self._set_progress("organize", 0.0)
         
         def auto_index_thread():
             try:
-                if self.analyzer is None:
-                    self.root.after(0, lambda: self.organize_log.insert(
-                        "end", "⏳ Loading AI models (this may take a moment)...\n"
-                    ))
-                    self.analyzer = MediaAnalyzer()
+                if not self._analyzer_future.done():
+                    self._log("organize", "⏳ Loading AI models (this may take a moment)...\n")
+                self._get_analyzer()
                 
                 if self.index_stop_flag.is_set():
                     return
                 
-                self.search_index = MediaSearchIndex(index_path=index_path)
-                media_path = Path(media_dir)
-                all_extensions = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS
-                
-                media_files = []
-                for ext in all_extensions:
-                    media_files.extend(media_path.rglob(f'*{ext}'))
-                    media_files.extend(media_path.rglob(f'*{ext.upper()}'))
-                
-                self.root.after(0, lambda: self.organize_log.insert(
-                    "end", f"📊 Found {len(media_files)} media files to index...\n\n"
-                ))
+                self.search_index = self._open_index(index_path)
+                media_files = self._pending_media_files(media_dir, reindex_all, "organize")
                 
-                indexed = 0
-                skipped = 0
+                self._log("organize", f"📊 Found {len(media_files)} media files to index...\n\n")
                 
-                for i, media_file in enumerate(media_files):
-                    if self.index_stop_flag.is_set():
-                        self.root.after(0, lambda: self.organize_log.insert(
-                            "end", f"\n⚠ Indexing stopped at file {i+1}/{len(media_files)}\n"
-                        ))
-                        break
-                    
-                    try:
-                        file_path = str(media_file)
-                        file_ext = media_file.suffix.lower()
-                        
-                        if file_ext in IMAGE_EXTENSIONS:
-                            embedding = self.analyzer.extract_image_embedding(file_path)
-                            file_type = "image"
-                        elif file_ext in VIDEO_EXTENSIONS:
-                            embedding = self.analyzer.extract_video_embedding(file_path)
-                            file_type = "video"
-                        else:
-                            continue
-                        
-                        self.search_index.add_media(file_path, embedding, file_type)
-                        indexed += 1
-                        
-                        if (i + 1) % 10 == 0:
-                            self.root.after(0, lambda idx=indexed, total=len(media_files): 
-                                          self.organize_log.insert("end", 
-                                          f"📈 Indexing progress: {idx}/{total} files...\n"))
-                            self.root.after(0, lambda: self.organize_log.see("end"))
-                    except Exception as e:
-                        skipped += 1
+                indexed, skipped = self._index_media_files(
+                    media_files, self.index_stop_flag, "organize",
+                    progress_message="📈 Indexing progress: {indexed}/{total} files...\n"
+                )
                 
                 if not self.index_stop_flag.is_set():
                     self.search_index.save()
                     stats = self.search_index.get_stats()
                     
-                    self.root.after(0, lambda: (
-                        self.organize_log.insert("end", f"\n✅ Indexing complete!\n"),
-                        self.organize_log.insert("end", f"✅ Indexed: {indexed} files\n"),
-                        self.organize_log.insert("end", f"⚠ Skipped: {skipped} files\n"),
-                        self.organize_log.insert("end", f"📊 Total in index: {stats['total_entries']} files (📷 {stats['images']}, 🎬 {stats['videos']})\n"),
-                        self.organize_log.see("end")
-                    ))
+                    self._log("organize", f"\n✅ Indexing complete!\n")
+                    self._log("organize", f"✅ Indexed: {indexed} files\n")
+                    self._log("organize", f"⚠ Skipped: {skipped} files\n")
+                    self._log("organize", f"📊 Total in index: {stats['total_entries']} files (📷 {stats['images']}, 🎬 {stats['videos']})\n")
                     
                     if hasattr(self, 'stats_label'):
                         stats_text = f"📊 Total: {stats['total_entries']} | 📷 Images: {stats['images']} | 🎬 Videos: {stats['videos']}"
                         self.stats_label.configure(text=stats_text)
             except Exception as e:
                 if not self.index_stop_flag.is_set():
-                    self.root.after(0, lambda: self.organize_log.insert(
-                        "end", f"\n❌ Indexing error: {str(e)}\n"
-                    ))
+                    self._log("organize", f"\n❌ Indexing error: {str(e)}\n")
             finally:
                 self.root.after(0, lambda: (
-                    self.stop_progress_animation("organize"),
+                    self._set_progress("organize", 1.0),
                     self.organize_btn.configure(state="normal"),
                     self.organize_stop_btn.configure(state="disabled")
                 ))
         
-        threading.Thread(target=auto_index_thread, daemon=True).start()
+        self._submit("auto_index", auto_index_thread)
+    
+    def _pending_media_files(self, media_dir, reindex_all, log_name):
+        """
+        List the media files in a folder that still need embedding.
+        
+        Files already in the loaded search index are skipped so re-runs only embed
+        what changed; with reindex_all the index is cleared and everything is returned.
+        
+        Args:
+            media_dir: Folder to scan
+            reindex_all: Whether to rebuild the index from scratch
+            log_name: Log receiving the skip summary ("organize" or "index")
+            
+        Returns:
+            List of (path, lowercase extension) tuples to index
+        """
+        media_files = list(iter_media(media_dir, ALL_EXTENSIONS))
+        
+        if reindex_all:
+            self.search_index.clear()
+            return media_files
+        
+        # Indexes written by earlier versions may spell the same file differently
+        # (e.g. with or without a leading "./"), so both sides are normalized
+        seen = set(map(os.path.normpath, self.search_index.iter_paths()))
+        pending = [item for item in media_files if os.path.normpath(item[0]) not in seen]
+        if len(pending) < len(media_files):
+            self._log(log_name, f"⏭ Skipping {len(media_files) - len(pending)} already indexed files\n")
+        return pending
+    
+    def _index_media_files(self, media_files, stop_flag, log_name, progress_message):
+        """
+        Embed media files and add them to the search index with indexer.index_media_files.
+        
+        Runs on a worker thread; log messages go through the coalesced log queue and
+        progress drives the named bar.
+        
+        Args:
+            media_files: List of (path, lowercase extension) tuples
+            stop_flag: Event that stops indexing when set (checked between files)
+            log_name: Log receiving progress messages ("organize" or "index")
+            progress_message: Message logged every 10 files, formatted with indexed and total
+            
+        Returns:
+            Tuple of (indexed, skipped) file counts
+        """
+        from indexer import index_media_files
+        
+        def progress(done, total, indexed):
+            self._set_progress(log_name, done / total)
+            if done % 10 == 0:
+                self._log(log_name, progress_message.format(indexed=indexed, total=total))
+        
+        return index_media_files(
+            self.analyzer, self.search_index, media_files,
+            stop_event=stop_flag,
+            log=lambda message: self._log(log_name, f"⚠ {message}\n"),
+            progress=progress
+        )
     
     def index_media(self):
         """Index media files."""
+        if self._task_running("index", "auto_index"):
+            return
+        
         media_dir = self.index_folder_var.get()
         index_path = self.index_path_var.get()
         
-        if not media_dir or not os.path.exists(media_dir):
-            messagebox.showerror("Error", "Please select a valid media folder")
-            return
-        
         self.index_stop_flag.clear()
+        reindex_all = self.reindex_all_var.get()
         self.index_btn.configure(state="disabled")
         self.add_to_index_btn.configure(state="disabled")
         self.index_stop_btn.configure(state="normal")
-        self.index_progress.set(0)
-        self.start_progress_animation("index")
+        self._set_progress("index", 0.0)
+        self._log_queues["index"].clear()
         self.index_log.delete(1.0, "end")
         self.index_log.insert("end", f"🤖 Initializing AI models...\n")
         
         def index_thread():
             try:
-                if self.analyzer is None:
-                    self.root.after(0, lambda: self.index_log.insert(
-                        "end", "⏳ Loading AI models (this may take a moment)...\n"
-                    ))
-                    self.analyzer = MediaAnalyzer()
+                if not media_dir or not os.path.isdir(media_dir):
+                    self._log("index", "❌ Please select a valid media folder\n")
+                    return
+                
+                if not self._analyzer_future.done():
+                    self._log("index", "⏳ Loading AI models (this may take a moment)...\n")
+                self._get_analyzer()
                 
                 if self.index_stop_flag.is_set():
                     return
                 
-                self.search_index = MediaSearchIndex(index_path=index_path)
-                media_path = Path(media_dir)
-                all_extensions = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS
+                self.search_index = self._open_index(index_path)
+                media_files = self._pending_media_files(media_dir, reindex_all, "index")
                 
-                media_files = []
-                for ext in all_extensions:
-                    media_files.extend(media_path.rglob(f'*{ext}'))
-                    media_files.extend(media_path.rglob(f'*{ext.upper()}'))
-                
-                self.root.after(0, lambda: self.index_log.insert(
-                    "end", f"📊 Found {len(media_files)} media files to index...\n\n"
-                ))
+                self._log("index", f"📊 Found {len(media_files)} media files to index...\n\n")
                 
-                indexed = 0
-                skipped = 0
-                
-                for i, media_file in enumerate(media_files):
-                    if self.index_stop_flag.is_set():
-                        self.root.after(0, lambda: self.index_log.insert(
-                            "end", f"\n⚠ Stopped at file {i+1}/{len(media_files)}\n"
-                        ))
-                        break
-                    
-                    try:
-                        file_path = str(media_file)
-                        file_ext = media_file.suffix.lower()
-                        
-                        if file_ext in IMAGE_EXTENSIONS:
-                            embedding = self.analyzer.extract_image_embedding(file_path)
-                            file_type = "image"
-                        elif file_ext in VIDEO_EXTENSIONS:
-                            embedding = self.analyzer.extract_video_embedding(file_path)
-                            file_type = "video"
-                        else:
-                            continue
-                        
-                        self.search_index.add_media(file_path, embedding, file_type)
-                        indexed += 1
-                        
-                        if (i + 1) % 10 == 0:
-                            self.root.after(0, lambda idx=indexed, total=len(media_files): 
-                                          self.index_log.insert("end", 
-                                          f"📈 Progress: {idx}/{total} files indexed...\n"))
-                    except Exception as e:
-                        skipped += 1
+                indexed, skipped = self._index_media_files(
+                    media_files, self.index_stop_flag, "index",
+                    progress_message="📈 Progress: {indexed}/{total} files indexed...\n"
+                )
                 
                 if not self.index_stop_flag.is_set():
                     self.search_index.save()
                     stats = self.search_index.get_stats()
                     stats_text = f"📊 Total: {stats['total_entries']} | 📷 Images: {stats['images']} | 🎬 Videos: {stats['videos']}"
                     
-                    self.root.after(0, lambda: (
-                        self.index_log.insert("end", f"\n✅ Indexing complete!\n"),
-                        self.index_log.insert("end", f"✅ Indexed: {indexed} files\n"),
-                        self.index_log.insert("end", f"⚠ Skipped: {skipped} files\n"),
-                        self.stats_label.configure(text=stats_text)
-                    ))
+                    self._log("index", f"\n✅ Indexing complete!\n")
+                    self._log("index", f"✅ Indexed: {indexed} files\n")
+                    self._log("index", f"⚠ Skipped: {skipped} files\n")
+                    self.root.after(0, lambda: self.stats_label.configure(text=stats_text))
             except Exception as e:
                 if not self.index_stop_flag.is_set():
-                    self.root.after(0, lambda: self.index_log.insert(
-                        "end", f"\n❌ Error: {str(e)}\n"
-                    ))
+                    self._log("index", f"\n❌ Error: {str(e)}\n")
             finally:
                 self.root.after(0, lambda: (
-                    self.stop_progress_animation("index"),
+                    self._set_progress("index", 1.0),
                     self.index_btn.configure(state="normal"),
                     self.add_to_index_btn.configure(state="normal"),
                     self.index_stop_btn.configure(state="disabled")
                 ))
         
-        threading.Thread(target=index_thread, daemon=True).start()
+        self._submit("index", index_thread)
     
     def add_to_index(self):
         """Add new files to existing index."""
-        media_dir = self.index_folder_var.get()
-        index_path = self.index_path_var.get()
-        
-        if not media_dir or not os.path.exists(media_dir):
-            messagebox.showerror("Error", "Please select a valid media folder")
+        if self._task_running("index", "auto_index"):
             return
         
-        if not os.path.exists(os.path.join(index_path, "metadata.json")):
-            messagebox.showwarning("Warning", "No existing index found. Please create an index first.")
-            return
+        media_dir = self.index_folder_var.get()
+        index_path = self.index_path_var.get()
         
         self.add_to_index_stop_flag.clear()
         self.add_to_index_btn.configure(state="disabled")
         self.index_btn.configure(state="disabled")
         self.add_stop_btn.configure(state="normal")
-        self.index_progress.set(0)
-        self.start_progress_animation("index")
+        self._set_progress("index", 0.0)
+        self._log_queues["index"].clear()
         self.index_log.delete(1.0, "end")
         self.index_log.insert("end", f"📂 Loading existing index...\n")
         
         def add_thread():
             try:
-                if self.analyzer is None:
-                    self.root.after(0, lambda: self.index_log.insert(
-                        "end", "⏳ Loading AI models (this may take a moment)...\n"
-                    ))
-                    self.analyzer = MediaAnalyzer()
-                
-                if self.add_to_index_stop_flag.is_set():
+                if not media_dir or not os.path.isdir(media_dir):
+                    self._log("index", "❌ Please select a valid media folder\n")
                     return
                 
-                self.search_index = MediaSearchIndex(index_path=index_path)
-                existing_paths = {m['file_path'] for m in self.search_index.metadata}
+                if not any(os.path.exists(os.path.join(index_path, name)) for name in ("faiss.index", "vectors.f32")):
+                    self._log("index", "⚠ No existing index found. Please create an index first.\n")
+                    return
                 
-                media_path = Path(media_dir)
-                all_extensions = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS
+                if not self._analyzer_future.done():
+                    self._log("index", "⏳ Loading AI models (this may take a moment)...\n")
+                self._get_analyzer()
                 
-                media_files = []
-                for ext in all_extensions:
-                    media_files.extend(media_path.rglob(f'*{ext}'))
-                    media_files.extend(media_path.rglob(f'*{ext.upper()}'))
+                if self.add_to_index_stop_flag.is_set():
+                    return
                 
-                new_files = [f for f in media_files if str(f) not in existing_paths]
+                self.search_index = self._open_index(index_path)
+                new_files = self._pending_media_files(media_dir, False, "index")
                 
-                self.root.after(0, lambda: self.index_log.insert(
-                    "end", f"📊 Found {len(new_files)} new files to index (out of {len(media_files)} total)...\n\n"
-                ))
+                self._log("index", f"📊 Found {len(new_files)} new files to index...\n\n")
                 
                 if not new_files:
+                    self._log("index", "ℹ️ No new files to index!\n")
                     self.root.after(0, lambda: (
-                        self.index_log.insert("end", "ℹ️ No new files to index!\n"),
-                        self.stop_progress_animation("index"),
+                        self._set_progress("index", 1.0),
                         self.add_to_index_btn.configure(state="normal"),
                         self.index_btn.configure(state="normal"),
                         self.add_stop_btn.configure(state="disabled")
                     ))
                     return
                 
-                indexed = 0
-                skipped = 0
-                
-                for i, media_file in enumerate(new_files):
-                    if self.add_to_index_stop_flag.is_set():
-                        self.root.after(0, lambda: self.index_log.insert(
-                            "end", f"\n⚠ Stopped at file {i+1}/{len(new_files)}\n"
-                        ))
-                        break
-                    
-                    try:
-                        file_path = str(media_file)
-                        file_ext = media_file.suffix.lower()
-                        
-                        if file_ext in IMAGE_EXTENSIONS:
-                            embedding = self.analyzer.extract_image_embedding(file_path)
-                            file_type = "image"
-                        elif file_ext in VIDEO_EXTENSIONS:
-                            embedding = self.analyzer.extract_video_embedding(file_path)
-                            file_type = "video"
-                        else:
-                            continue
-                        
-                        self.search_index.add_media(file_path, embedding, file_type)
-                        indexed += 1
-                        
-                        if (i + 1) % 10 == 0:
-                            self.root.after(0, lambda idx=indexed, total=len(new_files): 
-                                          self.index_log.insert("end", 
-                                          f"📈 Progress: {idx}/{total} new files indexed...\n"))
-                    except Exception as e:
-                        skipped += 1
+                indexed, skipped = self._index_media_files(
+                    new_files, self.add_to_index_stop_flag, "index",
+                    progress_message="📈 Progress: {indexed}/{total} new files indexed...\n"
+                )
                 
                 if not self.add_to_index_stop_flag.is_set():
                     self.search_index.save()
                     stats = self.search_index.get_stats()
                     stats_text = f"📊 Total: {stats['total_entries']} | 📷 Images: {stats['images']} | 🎬 Videos: {stats['videos']}"
                     
-                    self.root.after(0, lambda: (
-                        self.index_log.insert("end", f"\n✅ Added {indexed} new files to index!\n"),
-                        self.index_log.insert("end", f"⚠ Skipped: {skipped} files\n"),
-                        self.stats_label.configure(text=stats_text)
-                    ))
+                    self._log("index", f"\n✅ Added {indexed} new files to index!\n")
+                    self._log("index", f"⚠ Skipped: {skipped} files\n")
+                    self.root.after(0, lambda: self.stats_label.configure(text=stats_text))
             except Exception as e:
                 if not self.add_to_index_stop_flag.is_set():
-                    self.root.after(0, lambda: self.index_log.insert(
-                        "end", f"\n❌ Error: {str(e)}\n"
-                    ))
+                    self._log("index", f"\n❌ Error: {str(e)}\n")
             finally:
                 self.root.after(0, lambda: (
-                    self.stop_progress_animation("index"),
+                    self._set_progress("index", 1.0),
                     self.add_to_index_btn.configure(state="normal"),
                     self.index_btn.configure(state="normal"),
                     self.add_stop_btn.configure(state="disabled")
                 ))
         
-        threading.Thread(target=add_thread, daemon=True).start()
+        self._submit("index", add_thread)
     
     def search_media(self):
         """Search for media."""
+        if self._task_running("search", "load_index"):
+            return
+        
         query = self.search_query_var.get().strip()
         
         if not query:
             messagebox.showwarning("Warning", "Please enter a search query")
             return
         
-        if self.analyzer is None:
+        if not self._analyzer_future.done():
             messagebox.showinfo("Info", "Loading AI models... This may take a moment.")
-            self.analyzer = MediaAnalyzer()
-        
-        if self.search_index is None:
-            self.load_index()
+        try:
+            self._get_analyzer()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load AI models: {str(e)}")
+            return
         
         if self.search_index is None or self.search_index.faiss_index.ntotal == 0:
             messagebox.showwarning("Warning", "No index found. Please index your media first.")
@@ -785,7 +882,7 @@ For help, see the README.md file."""
                     messagebox.showerror("Error", f"Search failed: {str(e)}")
                 ))
         
-        threading.Thread(target=search_thread, daemon=True).start()
+        self._submit("search", search_thread)
     
     def display_results(self, results, query):
         """Display search results."""
@@ -839,48 +936,43 @@ For help, see the README.md file."""
             except Exception as e:
                 messagebox.showerror("Error", f"Could not open file: {str(e)}")
     
-    def start_progress_animation(self, progress_type):
-        """Start animated progress bar."""
-        if progress_type == "organize":
-            self.organize_progress_animating = True
-            self._animate_progress("organize", 0)
-        elif progress_type == "index":
-            self.index_progress_animating = True
-            self._animate_progress("index", 0)
-    
-    def stop_progress_animation(self, progress_type):
-        """Stop animated progress bar."""
-        if progress_type == "organize":
-            self.organize_progress_animating = False
-            self.organize_progress.set(1.0)
-        elif progress_type == "index":
-            self.index_progress_animating = False
-            self.index_progress.set(1.0)
-    
-    def _animate_progress(self, progress_type, value):
-        """Animate progress bar."""
-        if progress_type == "organize" and self.organize_progress_animating:
-            value = (value + 0.02) % 1.0
-            self.organize_progress.set(value)
-            self.root.after(50, lambda: self._animate_progress("organize", value))
-        elif progress_type == "index" and self.index_progress_animating:
-            value = (value + 0.02) % 1.0
-            self.index_progress.set(value)
-            self.root.after(50, lambda: self._animate_progress("index", value))
+    def _open_index(self, index_path):
+        """
+        Open the search index, importing faiss on first use.
+        
+        Args:
+            index_path: Directory holding the index files
+            
+        Returns:
+            MediaSearchIndex instance
+        """
+        from search_index import MediaSearchIndex
+        return MediaSearchIndex(index_path=index_path)
     
     def load_index(self):
-        """Load existing index."""
-        try:
-            index_path = self.index_path_var.get() if hasattr(self, 'index_path_var') else self.index_path
-            self.search_index = MediaSearchIndex(index_path=index_path)
-            
-            if self.search_index.faiss_index.ntotal > 0:
-                stats = self.search_index.get_stats()
-                if hasattr(self, 'stats_label'):
-                    stats_text = f"📊 Index loaded: {stats['total_entries']} files (📷 {stats['images']}, 🎬 {stats['videos']})"
-                    self.stats_label.configure(text=stats_text)
-        except Exception:
-            pass
+        """Load the existing index on the worker pool, enabling search when it is done."""
+        index_path = self.index_path_var.get() if hasattr(self, 'index_path_var') else self.index_path
+        
+        def load_thread():
+            try:
+                search_index = self._open_index(index_path)
+            except Exception:
+                search_index = None
+            self.root.after(0, lambda: self._index_loaded(search_index))
+        
+        self._submit("load_index", load_thread)
+    
+    def _index_loaded(self, search_index):
+        """Show a background-loaded index on the UI thread and enable search."""
+        # An indexing job that started meanwhile has already opened its own copy
+        if self.search_index is None:
+            self.search_index = search_index
+        self.search_btn.configure(state="normal")
+        
+        if self.search_index is not None and self.search_index.faiss_index.ntotal > 0:
+            stats = self.search_index.get_stats()
+            stats_text = f"📊 Index loaded: {stats['total_entries']} files (📷 {stats['images']}, 🎬 {stats['videos']})"
+            self.stats_label.configure(text=stats_text)
 
 
 def main():
@@ -0,0 +1,223 @@
+"""
+Indexing pipeline shared by the command line and the GUI.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from ai_analyzer import MediaAnalyzer, preprocess_image_file
+from embedding_cache import EmbeddingCache
+from media_organizer import media_skip_reason, IMAGE_EXTENSIONS, VIDEO_EXTENSIONS
+from search_index import MediaSearchIndex
+
+# Number of images embedded per CLIP forward pass
+IMAGE_BATCH_SIZE = 64
+
+# Embeddings are buffered and added to the index this many at a time
+INDEX_FLUSH_SIZE = 256
+
+# Image decoding and resizing runs on this many threads (PIL releases the GIL while
+# decoding and resizing), at most DECODE_QUEUE_SIZE files ahead of the embedding loop
+DECODE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+DECODE_QUEUE_SIZE = 64
+
+# The index is saved after every CHECKPOINT_INTERVAL newly indexed files so a stop or
+# crash loses at most that much work
+CHECKPOINT_INTERVAL = 500
+
+
+def index_media_files(analyzer: MediaAnalyzer, search_index: MediaSearchIndex,
+                      media_files: List[Tuple[str, str]],
+                      stop_event: Optional[threading.Event] = None,
+                      log: Callable[[str], None] = print,
+                      progress: Optional[Callable[[int, int, int], None]] = None) -> Tuple[int, int]:
+    """
+    Embed media files and add them to the search index.
+    
+    A producer thread checks each file's header, looks it up in the embedding cache and
+    schedules image decoding + resizing on a thread pool, at most DECODE_QUEUE_SIZE files
+    ahead, so disk I/O and decoding overlap with CLIP inference. Images are embedded in
+    batches of IMAGE_BATCH_SIZE; videos already batch their sampled frames, so they are
+    embedded one at a time. Files whose contents are in the embedding cache skip decoding
+    and embedding entirely. The index is saved every CHECKPOINT_INTERVAL indexed files
+    and when stopped; the caller saves it once indexing completes.
+    
+    Args:
+        analyzer: Loaded MediaAnalyzer
+        search_index: Index the embeddings are added to
+        media_files: List of (path, lowercase extension) tuples
+        stop_event: Event that stops indexing when set (checked between files)
+        log: Called with each message (without a trailing newline)
+        progress: Called with (files done, total files, files indexed) after each file
+    
+    Returns:
+        Tuple of (indexed, skipped) file counts
+    """
+    indexed = 0
+    skipped = 0
+    total = len(media_files)
+    last_checkpoint = 0
+    skip_reasons = {}
+    
+    def stopped():
+        return stop_event is not None and stop_event.is_set()
+    
+    def count_skip(reason, count=1):
+        nonlocal skipped
+        skip_reasons[reason] = skip_reasons.get(reason, 0) + count
+        skipped += count
+    
+    # Buffered results, added to the index in bulk
+    batch_paths = []
+    batch_embeddings = []
+    batch_types = []
+    
+    def flush():
+        search_index.add_media_batch(batch_paths, batch_embeddings, batch_types)
+        batch_paths.clear()
+        batch_embeddings.clear()
+        batch_types.clear()
+    
+    def add(file_path, embedding, file_type):
+        batch_paths.append(file_path)
+        batch_embeddings.append(embedding)
+        batch_types.append(file_type)
+        if len(batch_paths) >= INDEX_FLUSH_SIZE:
+            flush()
+    
+    def checkpoint():
+        nonlocal last_checkpoint
+        if indexed - last_checkpoint >= CHECKPOINT_INTERVAL:
+            flush()
+            search_index.save()
+            last_checkpoint = indexed
+    
+    # Consumer side: embeds decoded images in batches
+    image_batch = []
+    
+    def flush_images():
+        nonlocal indexed
+        if not image_batch:
+            return
+        file_paths = [file_path for file_path, _, _ in image_batch]
+        decoded_images = []
+        for file_path, future, _ in image_batch:
+            try:
+                decoded_images.append(future.result())
+            except Exception as e:
+                log(f"Error decoding {file_path}: {e}")
+                decoded_images.append(None)
+        try:
+            embeddings = analyzer.extract_image_embeddings_batch(file_paths, decoded_images)
+            for (file_path, _, cache_key), embedding in zip(image_batch, embeddings):
+                add(file_path, embedding, "image")
+                if cache_key is not None:
+                    embedding_cache.put(cache_key, embedding)
+            indexed += len(file_paths)
+        except Exception as e:
+            log(f"Failed to embed a batch of {len(file_paths)} images: {e}")
+            count_skip("failed to embed", len(file_paths))
+        image_batch.clear()
+        checkpoint()
+    
+    work_queue = queue.Queue(maxsize=DECODE_QUEUE_SIZE)
+    consumer_done = threading.Event()
+    decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix='phai-decode')
+    resolution = analyzer.input_resolution
+    # Files seen before (under any path) reuse their stored embedding
+    embedding_cache = EmbeddingCache(os.path.join(search_index.index_path, "emb_cache.db"),
+                                     namespace=analyzer.cache_namespace)
+    
+    def put_item(item):
+        while True:
+            try:
+                work_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if stopped() or consumer_done.is_set():
+                    return False
+    
+    def produce():
+        try:
+            for i, (file_path, file_ext) in enumerate(media_files):
+                if stopped() or consumer_done.is_set():
+                    break
+                future = None
+                cache_key = None
+                cached = None
+                # Size/header check keeps stubs and broken files away from the decoders
+                reason = media_skip_reason(file_path)
+                if reason is None:
+                    try:
+                        cache_key = embedding_cache.file_key(file_path)
+                        cached = embedding_cache.get(cache_key)
+                    except OSError:
+                        pass
+                if reason is None and cached is None and file_ext in IMAGE_EXTENSIONS:
+                    future = decode_pool.submit(preprocess_image_file, file_path, resolution)
+                if not put_item((i, file_path, file_ext, future, reason, cache_key, cached)):
+                    break
+        finally:
+            put_item(None)
+    
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    
+    try:
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+            i, file_path, file_ext, future, reason, cache_key, cached = item
+            
+            if stopped():
+                log(f"Stopped at file {i + 1}/{total}")
+                break
+            
+            try:
+                if reason is not None:
+                    count_skip(reason)
+                elif cached is not None:
+                    add(file_path, cached, "image" if file_ext in IMAGE_EXTENSIONS else "video")
+                    indexed += 1
+                    checkpoint()
+                elif future is not None:
+                    image_batch.append((file_path, future, cache_key))
+                    if len(image_batch) >= IMAGE_BATCH_SIZE:
+                        flush_images()
+                elif file_ext in VIDEO_EXTENSIONS:
+                    embedding = analyzer.extract_video_embedding(file_path)
+                    add(file_path, embedding, "video")
+                    if cache_key is not None:
+                        embedding_cache.put(cache_key, embedding)
+                    indexed += 1
+                    checkpoint()
+            except Exception as e:
+                log(f"Failed to embed {file_path}: {e}")
+                count_skip("failed to embed")
+            
+            if progress is not None:
+                progress(i + 1, total, indexed)
+        
+        # The producer also ends the queue when it sees the stop flag, so a stop is
+        # handled here rather than only when an item is dequeued
+        if not stopped():
+            flush_images()
+        flush()
+        if stopped() and indexed > last_checkpoint:
+            # Keep what was embedded so far; a later run resumes from here
+            search_index.save()
+    finally:
+        # The producer may still be hashing or submitting; let it finish before
+        # shutting down the decode pool and closing the cache
+        consumer_done.set()
+        producer.join()
+        decode_pool.shutdown(wait=False, cancel_futures=True)
+        embedding_cache.close()
+    
+    for reason, count in skip_reasons.items():
+        log(f"Skipped {count} files: {reason}")
+    
+    return indexed, skipped
@@ -4,12 +4,11 @@ Main application entry point for PHAI media organizer.
 import argparse
 import os
 import sys
-from pathlib import Path
 from tqdm import tqdm
 
-from media_organizer import organize_media, IMAGE_EXTENSIONS, VIDEO_EXTENSIONS
-from ai_analyzer import MediaAnalyzer
-from search_index import MediaSearchIndex
+# ai_analyzer (torch, CLIP) and search_index (faiss) are imported inside the commands
+# that need them, so e.g. "organize" starts without loading either
+from media_organizer import organize_media, iter_media, ALL_EXTENSIONS
 
 
 def organize_command(args):
@@ -27,49 +26,31 @@ def organize_command(args):
 
 def index_command(args):
     """Index media files for search."""
+    from ai_analyzer import MediaAnalyzer
+    from search_index import MediaSearchIndex, INDEX_TYPES
+    from indexer import index_media_files
+    
+    if args.index_type is not None and args.index_type not in INDEX_TYPES:
+        print(f"Unknown index type {args.index_type!r}, expected one of: {', '.join(INDEX_TYPES)}")
+        return
+    
     print(f"Indexing media in {args.media_dir}...")
     
     # Initialize components
     analyzer = MediaAnalyzer()
-    search_index = MediaSearchIndex(index_path=args.index_path)
+    search_index = MediaSearchIndex(index_path=args.index_path, index_type=args.index_type)
     
     # Find all media files
-    media_path = Path(args.media_dir)
-    all_extensions = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS
-    
-    media_files = []
-    for ext in all_extensions:
-        media_files.extend(media_path.rglob(f'*{ext}'))
-        media_files.extend(media_path.rglob(f'*{ext.upper()}'))
+    media_files = list(iter_media(args.media_dir, ALL_EXTENSIONS))
     
     print(f"Found {len(media_files)} media files to index...")
     
-    # Process files
-    indexed = 0
-    skipped = 0
-    
-    for media_file in tqdm(media_files, desc="Indexing"):
-        try:
-            file_path = str(media_file)
-            file_ext = media_file.suffix.lower()
-            
-            # Determine file type
-            if file_ext in IMAGE_EXTENSIONS:
-                embedding = analyzer.extract_image_embedding(file_path)
-                file_type = "image"
-            elif file_ext in VIDEO_EXTENSIONS:
-                embedding = analyzer.extract_video_embedding(file_path)
-                file_type = "video"
-            else:
-                continue
-            
-            # Add to index
-            search_index.add_media(file_path, embedding, file_type)
-            indexed += 1
-            
-        except Exception as e:
-            print(f"\nError indexing {media_file}: {e}")
-            skipped += 1
+    with tqdm(total=len(media_files), desc="Indexing") as progress:
+        indexed, skipped = index_media_files(
+            analyzer, search_index, media_files,
+            log=tqdm.write,
+            progress=lambda done, total, indexed: progress.update(1)
+        )
     
     # Save index
     search_index.save()
@@ -88,6 +69,9 @@ def index_command(args):
 
 def search_command(args):
     """Search for media using natural language."""
+    from ai_analyzer import MediaAnalyzer
+    from search_index import MediaSearchIndex
+    
     # Initialize components
     analyzer = MediaAnalyzer()
     search_index = MediaSearchIndex(index_path=args.index_path)
@@ -127,7 +111,9 @@ def serve_command(args):
     print(f"Starting web server on http://localhost:{args.port}")
     print("Press Ctrl+C to stop")
     
-    app.run(debug=args.debug, host='0.0.0.0', port=args.port)
+    # Requests are handled on threads, so concurrent searches overlap in FAISS and PyTorch
+    # (for production, see the gunicorn setup in README.md)
+    app.run(debug=args.debug, host='0.0.0.0', port=args.port, threaded=True)
 
 
 def main():
@@ -148,6 +134,9 @@ def main():
     index_parser = subparsers.add_parser('index', help='Index media for search')
     index_parser.add_argument('--media-dir', required=True, help='Directory with organized media')
     index_parser.add_argument('--index-path', default='./data/index', help='Path to store index')
+    index_parser.add_argument('--index-type', default=None,
+                              help='Vector index type: auto, flat, hnsw, pq, ivfpq or cagra '
+                                   '(default: keep the existing one, or auto)')
     
     # Search command
     search_parser = subparsers.add_parser('search', help='Search for media')
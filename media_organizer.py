@@ -2,52 +2,164 @@
 Media organizer module for organizing pictures and videos into YYYYMMDD folders.
 """
 import os
+import sys
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Dict, List, Set, Tuple, Iterator, Optional
 from PIL import Image
-from PIL.ExifTags import TAGS
-import cv2
 
 # Supported media extensions
-IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.heic', '.heif', '.webp'}
-VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv', '.webm', '.m4v'}
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.heic', '.heif', '.webp'})
+VIDEO_EXTENSIONS = frozenset({'.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv', '.webm', '.m4v'})
+ALL_EXTENSIONS = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS
 
+# Threads used to walk top-level subdirectories during media discovery
+DISCOVERY_WORKERS = 8
 
-def get_media_date(file_path: str) -> datetime:
+# Threads reading capture dates, and separately copying or moving files, in organize_media;
+# both are I/O bound, so this exceeds the CPU count to keep the device queue busy
+ORGANIZE_WORKERS = min(32, (os.cpu_count() or 4) * 2)
+
+# Files smaller than this can't hold a real photo or video (thumbnails, stubs, AppleDouble files)
+MIN_MEDIA_SIZE = 1024
+
+# Leading bytes of every supported container. Decoders sniff content rather than trusting
+# the extension, so a file passes if it matches any of them
+MEDIA_SIGNATURES = (
+    b'\xff\xd8\xff',        # JPEG
+    b'\x89PNG',              # PNG
+    b'GIF8',                 # GIF
+    b'BM',                   # BMP
+    b'II*\x00', b'MM\x00*',  # TIFF
+    b'RIFF',                 # WebP, AVI
+    b'\x1a\x45\xdf\xa3',    # Matroska, WebM
+    b'\x30\x26\xb2\x75',    # ASF (WMV)
+    b'FLV',                  # Flash video
+)
+
+# EXIF tags holding the capture date: DateTimeOriginal lives in the Exif sub-IFD,
+# DateTime in the main IFD
+EXIF_IFD_POINTER = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+
+# Box types found at offset 4 of ISO base media files (HEIC/HEIF, MP4, MOV, M4V)
+ISO_BOX_TYPES = frozenset((b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot'))
+
+
+def iter_media(root: str, extensions, workers: int = DISCOVERY_WORKERS) -> Iterator[Tuple[str, str]]:
     """
-    Extract creation date from media file.
-    Tries multiple methods: EXIF data, file metadata, file modification time.
+    Recursively yield paths of media files under a directory in a single pass.
+    
+    Uses os.scandir so each directory is listed once and the file-type checks reuse the
+    cached directory entry instead of a stat() per path. Hidden directories are skipped.
+    With several workers, the top-level subdirectories are walked on a thread pool, which
+    hides per-directory latency on network filesystems. The root is normalized first, so
+    paths are spelled the way str(Path) spells them (no leading "./").
+    
+    Args:
+        root: Directory to walk
+        extensions: Set of lowercase extensions (with leading dot) to include
+        workers: Number of threads walking top-level subdirectories in parallel
+    
+    Yields:
+        (path, lowercase extension) tuples for matching files
     """
-    file_path_obj = Path(file_path)
+    root = os.path.normpath(root)
+    if workers <= 1:
+        yield from _walk_media(root, extensions)
+        return
     
-    # Try EXIF data for images
-    if file_path_obj.suffix.lower() in IMAGE_EXTENSIONS:
+    subdirs = []
+    yield from _walk_media(root, extensions, subdirs)
+    if subdirs:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for found in pool.map(lambda d: list(_walk_media(d, extensions)), subdirs):
+                yield from found
+
+
+def _walk_media(root: str, extensions, subdirs: Optional[List[str]] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Walk a directory tree with os.scandir, yielding (path, extension) for media files.
+    
+    If subdirs is given, subdirectories of root are appended to it instead of being walked.
+    """
+    stack = [root]
+    while stack:
+        current = stack.pop()
         try:
-            image = Image.open(file_path)
-            exifdata = image.getexif()
-            if exifdata:
-                # Try to get DateTimeOriginal (tag 36867) or DateTime (tag 306)
-                for tag_id, value in exifdata.items():
-                    tag = TAGS.get(tag_id, tag_id)
-                    if tag == 'DateTimeOriginal' or tag == 'DateTime':
-                        try:
-                            return datetime.strptime(str(value), '%Y:%m:%d %H:%M:%S')
-                        except:
-                            pass
-        except Exception:
-            pass
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith('.'):
+                            if subdirs is not None:
+                                subdirs.append(entry.path)
+                            else:
+                                stack.append(entry.path)
+                    elif entry.is_file():
+                        name = entry.name
+                        dot = name.rfind('.')
+                        if dot <= 0:
+                            continue
+                        ext = name[dot:].lower()
+                        if ext in extensions:
+                            yield entry.path, ext
+        except OSError as e:
+            print(f"Error scanning {current}: {e}")
+
+
+def media_skip_reason(file_path: str) -> Optional[str]:
+    """
+    Cheaply check that a file looks like real media before handing it to a decoder.
+    
+    Only the size and the first 12 bytes are read, so known-bad files never reach PIL or
+    the video decoders.
     
-    # Try video metadata
-    if file_path_obj.suffix.lower() in VIDEO_EXTENSIONS:
+    Args:
+        file_path: Path to the media file
+        
+    Returns:
+        Reason the file should be skipped ("too small", "unrecognized format" or
+        "unreadable"), or None if it looks decodable
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < MIN_MEDIA_SIZE:
+                return "too small"
+            header = f.read(12)
+    except OSError:
+        return "unreadable"
+    
+    if header.startswith(MEDIA_SIGNATURES) or header[4:8] in ISO_BOX_TYPES:
+        return None
+    return "unrecognized format"
+
+
+def get_media_date(file_path: str, ext: Optional[str] = None) -> datetime:
+    """
+    Extract creation date from media file.
+    Tries EXIF data for images, then the file modification time.
+    
+    Args:
+        file_path: Path to the media file
+        ext: Lowercase extension, if the caller already has it
+    """
+    if ext is None:
+        ext = os.path.splitext(file_path)[1].lower()
+    
+    # Try EXIF data for images
+    if ext in IMAGE_EXTENSIONS:
         try:
-            cap = cv2.VideoCapture(file_path)
-            if cap.isOpened():
-                # Try to get creation date from video metadata
-                # This is platform-dependent and may not always work
-                pass
-            cap.release()
+            with Image.open(file_path) as image:
+                exifdata = image.getexif()
+                # Look up DateTimeOriginal, then DateTime, directly instead of scanning every tag
+                for value in (exifdata.get_ifd(EXIF_IFD_POINTER).get(EXIF_DATETIME_ORIGINAL),
+                              exifdata.get(EXIF_DATETIME)):
+                    date = _parse_exif_datetime(value)
+                    if date is not None:
+                        return date
         except Exception:
             pass
     
@@ -60,6 +172,26 @@ def get_media_date(file_path: str) -> datetime:
         return datetime.now()
 
 
+def _parse_exif_datetime(value) -> Optional[datetime]:
+    """
+    Parse an EXIF "YYYY:MM:DD HH:MM:SS" timestamp by slicing the fixed-width fields.
+    
+    Args:
+        value: EXIF tag value, or None
+        
+    Returns:
+        Parsed datetime, or None if the value is missing or malformed
+    """
+    if value is None:
+        return None
+    text = str(value).strip('\x00 ')
+    try:
+        return datetime(int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                        int(text[11:13]), int(text[14:16]), int(text[17:19]))
+    except ValueError:
+        return None
+
+
 def create_date_folder(base_path: str, date: datetime) -> str:
     """Create a folder with YYYYMMDD format."""
     folder_name = date.strftime('%Y%m%d')
@@ -68,14 +200,86 @@ def create_date_folder(base_path: str, date: datetime) -> str:
     return folder_path
 
 
-def organize_media(source_dir: str, dest_dir: str, copy_files: bool = True) -> List[Tuple[str, str]]:
+def fast_copy(src: str, dst: str):
+    """
+    Copy a file with its metadata, letting the filesystem share data blocks when it can.
+    
+    On macOS, clonefile() makes an APFS copy-on-write clone. On Linux, copy_file_range()
+    copies inside the kernel and reflinks on filesystems that support it (Btrfs, XFS).
+    Anything else falls back to shutil.copy2.
+    
+    Args:
+        src: Source file path
+        dst: Destination file path, which must not exist yet
+    """
+    if sys.platform == "darwin":
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0:
+                # clonefile() keeps the timestamps and permissions of the source
+                return
+        except (OSError, AttributeError):
+            pass
+    elif hasattr(os, "copy_file_range"):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            if remaining == 0:
+                shutil.copystat(src, dst)
+                return
+        except OSError:
+            # e.g. cross-filesystem copies on older kernels, or unsupported filesystems
+            pass
+    
+    shutil.copy2(src, dst)
+
+
+def _claim_dest_name(taken: Set[str], file_name: str) -> str:
+    """
+    Pick a name not yet used in a destination folder, appending _1, _2, ... on clashes.
+    
+    Args:
+        taken: Lowercased names already in the folder; the chosen name is added to it.
+            Names are compared case-insensitively so clashes are caught on
+            case-insensitive filesystems too.
+        file_name: Original file name
+        
+    Returns:
+        Unique file name
+    """
+    name = file_name
+    stem, ext = os.path.splitext(file_name)
+    counter = 1
+    while name.lower() in taken:
+        name = f"{stem}_{counter}{ext}"
+        counter += 1
+    taken.add(name.lower())
+    return name
+
+
+def organize_media(source_dir: str, dest_dir: str, copy_files: bool = True,
+                   stop_event: Optional[threading.Event] = None,
+                   progress: Optional[Callable[[int, int], None]] = None) -> List[Tuple[str, str]]:
     """
     Organize media files into YYYYMMDD folders.
     
+    Capture dates are read and files are copied or moved on thread pools; destination
+    names are picked on the calling thread, in discovery order, so they match a
+    sequential run.
+    
     Args:
         source_dir: Directory containing source media files
         dest_dir: Base directory for organized media
         copy_files: If True, copy files; if False, move files
+        stop_event: Event that stops organizing when set; files not yet transferred
+            are left in place
+        progress: Called with (files done, total files) as each file's transfer finishes
     
     Returns:
         List of tuples (source_path, dest_path) for organized files
@@ -83,47 +287,65 @@ def organize_media(source_dir: str, dest_dir: str, copy_files: bool = True) -> L
     os.makedirs(dest_dir, exist_ok=True)
     organized_files = []
     
-    source_path = Path(source_dir)
-    all_extensions = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS
+    # Names in each date folder, listed once when the folder is first used, so picking
+    # a unique destination name needs no filesystem checks
+    folder_names: Dict[str, Set[str]] = {}
     
     # Find all media files
-    media_files = []
-    for ext in all_extensions:
-        media_files.extend(source_path.rglob(f'*{ext}'))
-        media_files.extend(source_path.rglob(f'*{ext.upper()}'))
+    media_files = list(iter_media(source_dir, ALL_EXTENSIONS))
     
     print(f"Found {len(media_files)} media files to organize...")
     
-    for media_file in media_files:
-        try:
-            # Get creation date
-            date = get_media_date(str(media_file))
-            
-            # Create date folder
-            date_folder = create_date_folder(dest_dir, date)
-            
-            # Destination path
-            dest_path = os.path.join(date_folder, media_file.name)
-            
-            # Handle duplicate names
-            counter = 1
-            base_dest = dest_path
-            while os.path.exists(dest_path):
-                name_parts = os.path.splitext(base_dest)
-                dest_path = f"{name_parts[0]}_{counter}{name_parts[1]}"
-                counter += 1
-            
-            # Copy or move file
-            if copy_files:
-                shutil.copy2(media_file, dest_path)
-            else:
-                shutil.move(str(media_file), dest_path)
-            
-            organized_files.append((str(media_file), dest_path))
-            print(f"Organized: {media_file.name} -> {os.path.basename(date_folder)}/")
-            
-        except Exception as e:
-            print(f"Error organizing {media_file}: {e}")
+    transfer = fast_copy if copy_files else shutil.move
+    
+    def stopped():
+        return stop_event is not None and stop_event.is_set()
+    
+    def transfer_unless_stopped(src, dst):
+        if stopped():
+            return False
+        transfer(src, dst)
+        return True
+    
+    transfers = []
+    with ThreadPoolExecutor(max_workers=ORGANIZE_WORKERS) as date_pool, \
+            ThreadPoolExecutor(max_workers=ORGANIZE_WORKERS) as transfer_pool:
+        # Get creation dates
+        dates = date_pool.map(lambda item: get_media_date(*item), media_files)
+        
+        for (media_file, _), date in zip(media_files, dates):
+            if stopped():
+                date_pool.shutdown(cancel_futures=True)
+                break
+            try:
+                # Create date folder
+                date_folder = os.path.join(dest_dir, date.strftime('%Y%m%d'))
+                taken = folder_names.get(date_folder)
+                if taken is None:
+                    create_date_folder(dest_dir, date)
+                    with os.scandir(date_folder) as entries:
+                        taken = {entry.name.lower() for entry in entries}
+                    folder_names[date_folder] = taken
+                
+                # Destination path, handling duplicate names
+                file_name = os.path.basename(media_file)
+                dest_path = os.path.join(date_folder, _claim_dest_name(taken, file_name))
+                
+                # Copy or move file
+                transfers.append((media_file, dest_path,
+                                  transfer_pool.submit(transfer_unless_stopped, media_file, dest_path)))
+            except Exception as e:
+                print(f"Error organizing {media_file}: {e}")
+        
+        for done, (media_file, dest_path, future) in enumerate(transfers, 1):
+            try:
+                if future.result():
+                    organized_files.append((media_file, dest_path))
+                    print(f"Organized: {os.path.basename(media_file)} -> {os.path.basename(os.path.dirname(dest_path))}/")
+            except Exception as e:
+                print(f"Error organizing {media_file}: {e}")
+            if progress is not None:
+                progress(done, len(transfers))
     
     return organized_files
 
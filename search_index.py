@@ -4,67 +4,465 @@ Search index module for storing and searching media embeddings.
 import os
 import json
 import pickle
+from array import array
 import numpy as np
 import faiss
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Iterator, FrozenSet
 from datetime import datetime
 
+# orjson is optional: it serializes metadata several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Supported index types: exact float32 search, HNSW graph, product quantization (PQ,
+# or IVF with PQ), CAGRA GPU graph (needs faiss built with cuVS, otherwise HNSW is
+# used), or "auto" (exact search until ANN_MIN_ENTRIES, then HNSW)
+INDEX_TYPES = ("auto", "flat", "hnsw", "pq", "ivfpq", "cagra")
+
+# faiss builds with the cuVS backend expose CAGRA and cuVS-accelerated IVF on the GPU
+CUVS_AVAILABLE = hasattr(faiss, "GpuIndexCagra")
+
+# Below this size brute-force search is fast enough and exact; "auto", "pq" and "ivfpq"
+# switch to approximate search once the index grows past it
+ANN_MIN_ENTRIES = 10000
+
+# HNSW graph parameters; searches explore at least HNSW_EF_SEARCH candidates, and at
+# least twice k, unless search() is given ef
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# IVF lists probed per query, unless search() is given nprobe
+IVF_NPROBE = 16
+
+# Product quantization: 32 sub-quantizers of 8 bits store a vector in 32 bytes
+PQ_M = 32
+PQ_NBITS = 8
+
+# Exact indexes are stored as raw float32 rows and rebuilt on load, this many rows at a time
+VECTOR_CHUNK_ROWS = 65536
+
+# Media types, stored per entry as their position in this tuple
+FILE_TYPES = ("image", "video")
+
+# Largest k the FAISS GPU search kernels support
+GPU_MAX_K = 1024
+
+# Vectors are stored as float16: half the memory and scan bandwidth of float32, and
+# CLIP embeddings (computed in half precision on CUDA) lose nothing measurable
+FP16_STORAGE = True
+
 
 class MediaSearchIndex:
     """Manages the vector index for semantic media search."""
     
-    def __init__(self, index_path: str = "./data/index"):
+    def __init__(self, index_path: str = "./data/index", index_type: str = None, read_only: bool = False):
         """
         Initialize the search index.
         
         Args:
             index_path: Base path for storing index files
+            index_type: One of INDEX_TYPES; defaults to the type saved with the index,
+                or "auto" for a new index. "cagra" keeps an exact CPU index on disk
+                and searches a CAGRA graph built on the GPU.
+            read_only: Open the index for searching only, so several server processes
+                share one copy of the vectors through the page cache: exact indexes
+                search the memory-mapped vectors file directly (without a GPU), and
+                IVF-PQ maps its inverted lists. Other FAISS files are read into memory.
+                The index can't be added to or saved
         """
         self.index_path = index_path
         self.embeddings_file = os.path.join(index_path, "embeddings.npy")
-        self.metadata_file = os.path.join(index_path, "metadata.json")
+        self.metadata_file = os.path.join(index_path, "metadata.jsonl")
+        self.legacy_metadata_file = os.path.join(index_path, "metadata.json")
         self.faiss_index_file = os.path.join(index_path, "faiss.index")
+        self.vectors_file = os.path.join(index_path, "vectors.f32")
+        self.config_file = os.path.join(index_path, "index_config.json")
         
         os.makedirs(index_path, exist_ok=True)
         
+        if index_type is None:
+            index_type = self._load_config().get("index_type", "auto")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+        self.index_type = index_type
+        self.read_only = read_only
+        
         # Initialize index
         # Note: Dimension will be set when first embedding is added
         # Default is 512 for ViT-B/32, but can be 768 for ViT-B/16 or ViT-L/14
         self.dimension = None
         self.faiss_index = None
         self.embeddings = None
-        self.metadata = []
+        
+        # Metadata is kept as parallel columns rather than a dict per entry: file paths,
+        # FILE_TYPES codes and added-at Unix timestamps; row i matches FAISS id i
+        self.paths = []
+        self.types = array('B')
+        self.added = array('d')
+        
+        # Number of leading metadata entries already in the on-disk log, or None when
+        # the log no longer matches them and save() has to rewrite it
+        self._logged_entries = None
+        
+        # Number of leading vectors already in the vectors file, or None when save() has
+        # to rewrite it
+        self._stored_vectors = None
+        
+        # (paths list, entry count, frozenset) behind known_abs_paths
+        self._known_abs_paths = None
+        
+        # With GPU FAISS, searches run on a GPU copy of the index; the CPU index stays
+        # the one that is added to and saved, and the copy is rebuilt after changes
+        self._gpu_resources = None
+        self._gpu_index = None
+        if hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0:
+            self._gpu_resources = faiss.StandardGpuResources()
+        
+        if self.index_type == "cagra" and (self._gpu_resources is None or not CUVS_AVAILABLE):
+            print("CAGRA needs a GPU and faiss with cuVS; using HNSW instead")
         
         self._load_index()
     
     def _load_index(self):
         """Load existing index if available."""
-        if os.path.exists(self.faiss_index_file) and os.path.exists(self.metadata_file):
+        config = self._load_config()
+        has_metadata = os.path.exists(self.metadata_file) or os.path.exists(self.legacy_metadata_file)
+        has_vectors = config.get("storage") == "vectors" and os.path.exists(self.vectors_file)
+        if (has_vectors or os.path.exists(self.faiss_index_file)) and has_metadata:
             try:
                 # Load FAISS index
-                self.faiss_index = faiss.read_index(self.faiss_index_file)
+                if has_vectors and self.read_only and self._gpu_resources is None:
+                    self._map_vectors(config["dimension"])
+                elif has_vectors:
+                    self._load_vectors(config["dimension"])
+                else:
+                    self.faiss_index = self._read_faiss_index()
+                    self._stored_vectors = None
+                self._gpu_index = None
                 self.dimension = self.faiss_index.d
+                self._configure_search(self.faiss_index)
                 
                 # Load metadata
-                with open(self.metadata_file, 'r') as f:
-                    self.metadata = json.load(f)
+                self._load_metadata()
                 
-                print(f"Loaded index with {len(self.metadata)} entries (dimension: {self.dimension})")
+                print(f"Loaded index with {len(self.paths)} entries (dimension: {self.dimension})")
             except Exception as e:
                 print(f"Error loading index: {e}. Creating new index.")
                 self._create_new_index()
         else:
             self._create_new_index()
     
+    def _load_metadata(self):
+        """
+        Read the metadata log, one JSON entry per line.
+        
+        Indexes saved before the log existed are read from metadata.json and converted
+        on the next save. A torn last line or entries beyond the FAISS index (from an
+        interrupted save) are dropped, and the log is rewritten on the next save.
+        """
+        self._clear_metadata()
+        
+        if not os.path.exists(self.metadata_file):
+            with open(self.legacy_metadata_file, 'r') as f:
+                entries = json.load(f)
+            complete = False
+        else:
+            entries = []
+            complete = True
+            with open(self.metadata_file, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("incomplete line")
+                        entries.append(_loads(line))
+                    except ValueError:
+                        complete = False
+                        break
+        
+        ntotal = self.faiss_index.ntotal
+        if len(entries) > ntotal:
+            del entries[ntotal:]
+            complete = False
+        
+        for entry in entries:
+            self.paths.append(entry["file_path"])
+            self.types.append(_type_code(entry.get("file_type", "image")))
+            self.added.append(datetime.fromisoformat(entry["added_at"]).timestamp())
+        self._logged_entries = len(self.paths) if complete else None
+    
+    def _write_metadata(self):
+        """
+        Bring the metadata log up to date.
+        
+        New entries are appended, so a save costs O(new entries); the log is only
+        rewritten in full (to a temporary file, then renamed) when it no longer
+        matches the in-memory entries, e.g. after clear().
+        """
+        if self._logged_entries is not None and os.path.exists(self.metadata_file):
+            new_rows = range(self._logged_entries, len(self.paths))
+            if new_rows:
+                with open(self.metadata_file, 'ab') as f:
+                    f.write(b"".join(_dumps_line(self._entry(i)) for i in new_rows))
+        else:
+            metadata_tmp = self.metadata_file + ".tmp"
+            with open(metadata_tmp, 'wb') as f:
+                f.write(b"".join(_dumps_line(self._entry(i)) for i in range(len(self.paths))))
+            os.replace(metadata_tmp, self.metadata_file)
+            if os.path.exists(self.legacy_metadata_file):
+                os.remove(self.legacy_metadata_file)
+        self._logged_entries = len(self.paths)
+    
+    def _clear_metadata(self):
+        """Empty the metadata columns."""
+        self.paths = []
+        self.types = array('B')
+        self.added = array('d')
+        self._logged_entries = None
+    
+    def _entry(self, i: int) -> Dict:
+        """
+        Build the metadata dictionary for one row.
+        
+        Args:
+            i: Row (FAISS id)
+        
+        Returns:
+            Dictionary with file_path, file_type, index and added_at
+        """
+        return {
+            "file_path": self.paths[i],
+            "file_type": FILE_TYPES[self.types[i]],
+            "index": i,
+            "added_at": datetime.fromtimestamp(self.added[i]).isoformat()
+        }
+    
+    def _read_faiss_index(self):
+        """
+        Read the saved FAISS file, memory-mapped when read-only.
+        
+        FAISS only maps the inverted lists of IVF indexes; HNSW and PQ indexes are read
+        into memory either way. Mapped pages are faulted in on first use, so the first
+        searches after a cold start are slower until the page cache is warm.
+        
+        Returns:
+            FAISS index
+        """
+        if self.read_only:
+            try:
+                return faiss.read_index(self.faiss_index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except Exception as e:
+                print(f"Index can't be memory-mapped, reading it into memory: {e}")
+        return faiss.read_index(self.faiss_index_file)
+    
+    def _load_vectors(self, dimension: int):
+        """
+        Rebuild an exact index from the vectors file.
+        
+        The file is memory-mapped and added in chunks, so loading never holds a second
+        full copy of the vectors. A torn last row from an interrupted save is ignored,
+        and the file is rewritten on the next save.
+        
+        Args:
+            dimension: Embedding dimension the file was written with
+        """
+        self.dimension = dimension
+        self.faiss_index = self._new_exact_index()
+        
+        row_bytes = 4 * dimension
+        size = os.path.getsize(self.vectors_file)
+        count = size // row_bytes
+        if count:
+            vectors = np.memmap(self.vectors_file, dtype=np.float32, mode='r', shape=(count, dimension))
+            for start in range(0, count, VECTOR_CHUNK_ROWS):
+                self.faiss_index.add(np.ascontiguousarray(vectors[start:start + VECTOR_CHUNK_ROWS]))
+            del vectors
+        self._stored_vectors = count if size == count * row_bytes else None
+    
+    def _map_vectors(self, dimension: int):
+        """
+        Search the vectors file in place instead of copying it into a FAISS index.
+        
+        Used for read-only exact indexes: every process mapping the file shares the
+        same page-cache copy. A torn last row from an interrupted save is ignored.
+        
+        Args:
+            dimension: Embedding dimension the file was written with
+        """
+        self.dimension = dimension
+        count = os.path.getsize(self.vectors_file) // (4 * dimension)
+        if count:
+            vectors = np.memmap(self.vectors_file, dtype=np.float32, mode='r', shape=(count, dimension))
+        else:
+            vectors = np.empty((0, dimension), dtype=np.float32)
+        self.faiss_index = _MappedFlatIndex(vectors)
+        self._stored_vectors = count
+    
+    def _write_vectors(self):
+        """
+        Bring the vectors file up to date with the exact index.
+        
+        Vectors added since the last save are appended and fsynced, so a save costs
+        O(new vectors); the file is only rewritten (to a temporary file, then renamed)
+        when it no longer matches the index, e.g. after clear().
+        """
+        ntotal = self.faiss_index.ntotal
+        if self._stored_vectors is not None and os.path.exists(self.vectors_file):
+            if ntotal > self._stored_vectors:
+                with open(self.vectors_file, 'ab') as f:
+                    f.write(self.faiss_index.reconstruct_n(self._stored_vectors, ntotal - self._stored_vectors).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+        else:
+            vectors_tmp = self.vectors_file + ".tmp"
+            with open(vectors_tmp, 'wb') as f:
+                for start in range(0, ntotal, VECTOR_CHUNK_ROWS):
+                    count = min(VECTOR_CHUNK_ROWS, ntotal - start)
+                    f.write(self.faiss_index.reconstruct_n(start, count).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(vectors_tmp, self.vectors_file)
+        self._stored_vectors = ntotal
+    
+    @staticmethod
+    def _is_exact(index) -> bool:
+        """Check whether an index is brute-force (flat or scalar-quantized) search."""
+        return isinstance(index, (faiss.IndexFlat, faiss.IndexScalarQuantizer))
+    
+    def _load_config(self) -> Dict:
+        """Load the saved index settings, if any."""
+        try:
+            with open(self.config_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
     def _create_new_index(self, dimension=None):
         """Create a new FAISS index."""
         if dimension is None:
             dimension = self.dimension if self.dimension else 512  # Default to 512
-        # Use L2 distance (Euclidean) for normalized embeddings
-        self.faiss_index = faiss.IndexFlatL2(dimension)
         self.dimension = dimension
-        self.metadata = []
+        # HNSW builds incrementally, so it can start as a graph; PQ and IVF-PQ need training
+        # data and "auto" only pays off once large, so these start as exact search
+        if self._resolved_index_type() == "hnsw":
+            self.faiss_index = self._new_hnsw_index()
+        else:
+            self.faiss_index = self._new_exact_index()
+        self._gpu_index = None
+        self._stored_vectors = None
+        self._clear_metadata()
+    
+    def _resolved_index_type(self) -> str:
+        """Get the index type to build, replacing CAGRA with HNSW when cuVS is unavailable."""
+        if self.index_type == "cagra" and (self._gpu_resources is None or not CUVS_AVAILABLE):
+            return "hnsw"
+        return self.index_type
+    
+    def _new_exact_index(self):
+        """
+        Create an empty brute-force index for the current dimension.
+        
+        Inner product on L2-normalized vectors is cosine similarity, returned sorted.
+        With a GPU the CPU index stays float32 and the GPU copy is stored as float16
+        (see _search_index), since GPU FAISS has no flat scalar-quantizer index.
+        """
+        if FP16_STORAGE and self._gpu_resources is None and self.index_type != "flat":
+            return faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_fp16,
+                                              faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexFlatIP(self.dimension)
+    
+    def _new_hnsw_index(self):
+        """Create an empty HNSW index for the current dimension."""
+        if FP16_STORAGE:
+            index = faiss.IndexHNSWSQ(self.dimension, faiss.ScalarQuantizer.QT_fp16, HNSW_M,
+                                      faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWFlat(self.dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        self._configure_search(index)
+        return index
+    
+    @staticmethod
+    def _configure_search(index):
+        """Apply query-time parameters, which depend on the index type."""
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        if hasattr(index, "nprobe"):
+            index.nprobe = IVF_NPROBE
+    
+    def _maybe_upgrade_index(self):
+        """
+        Rebuild an exact index as an approximate one once it is large enough.
+        
+        PQ and IVF-PQ are trained on every vector in the index, IVF-PQ with 4*sqrt(N)
+        lists; "auto" moves to HNSW.
+        """
+        target = self._resolved_index_type()
+        if target == "auto":
+            target = "hnsw"
+        ntotal = self.faiss_index.ntotal
+        # CAGRA graphs only live on the GPU (see _search_index), so the CPU index stays exact
+        if target in ("flat", "cagra") or ntotal < ANN_MIN_ENTRIES or not self._is_exact(self.faiss_index):
+            return
+        
+        vectors = self.faiss_index.reconstruct_n(0, ntotal)
+        if target == "hnsw":
+            index = self._new_hnsw_index()
+        else:
+            if target == "pq":
+                index = faiss.IndexPQ(self.dimension, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+            else:
+                nlist = int(4 * np.sqrt(ntotal))
+                quantizer = faiss.IndexFlatIP(self.dimension)
+                index = faiss.IndexIVFPQ(quantizer, self.dimension, nlist, PQ_M, PQ_NBITS,
+                                         faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            self._configure_search(index)
+        index.add(vectors)
+        self.faiss_index = index
+        self._gpu_index = None
+        print(f"Rebuilt index as {target} with {ntotal} entries")
+    
+    def clear(self):
+        """Remove every entry, keeping the current dimension."""
+        self._create_new_index()
+    
+    @property
+    def known_abs_paths(self) -> FrozenSet[str]:
+        """
+        Absolute paths of every indexed file, for O(1) membership tests.
+        
+        Built on first use and rebuilt after entries are added or cleared.
+        
+        Returns:
+            Frozen set of absolute file paths
+        """
+        cached = self._known_abs_paths
+        if cached is None or cached[0] is not self.paths or cached[1] != len(self.paths):
+            cached = (self.paths, len(self.paths), frozenset(map(os.path.abspath, self.paths)))
+            self._known_abs_paths = cached
+        return cached[2]
+    
+    def warm_known_abs_paths(self) -> int:
+        """
+        Build the known_abs_paths set now instead of on its first use.
+        
+        Returns:
+            Number of known absolute paths
+        """
+        return len(self.known_abs_paths)
+    
+    def iter_paths(self) -> Iterator[str]:
+        """
+        Iterate over the file paths already in the index.
+        
+        Returns:
+            Iterator of indexed file paths
+        """
+        return iter(self.paths)
     
     def add_media(self, file_path: str, embedding: np.ndarray, file_type: str = "image"):
         """
@@ -85,42 +483,149 @@ class MediaSearchIndex:
         
         embedding_dim = embedding.shape[0]
         
-        # Initialize dimension on first add if not set
-        if self.dimension is None:
-            self.dimension = embedding_dim
-            if self.faiss_index is None:
-                self._create_new_index(embedding_dim)
+        # An empty index adopts the dimension of the first embeddings added
+        if self.faiss_index is None or (self.faiss_index.ntotal == 0 and embedding_dim != self.dimension):
+            self._create_new_index(embedding_dim)
         
         if embedding_dim != self.dimension:
             print(f"Skipping {file_path}: embedding dimension mismatch ({embedding_dim} != {self.dimension})")
             return
         
-        # Add to FAISS index
+        # Add to FAISS index (normalized so inner product is cosine similarity)
         embedding_float32 = embedding.astype('float32').reshape(1, -1)
+        faiss.normalize_L2(embedding_float32)
         self.faiss_index.add(embedding_float32)
+        self._gpu_index = None
         
         # Store metadata
-        metadata_entry = {
-            "file_path": file_path,
-            "file_type": file_type,
-            "index": len(self.metadata),
-            "added_at": datetime.now().isoformat()
-        }
-        self.metadata.append(metadata_entry)
+        self.paths.append(file_path)
+        self.types.append(_type_code(file_type))
+        self.added.append(datetime.now().timestamp())
+    
+    def add_media_batch(self, file_paths: List[str], embeddings: np.ndarray, file_types: List[str]):
+        """
+        Add several media files to the index with a single FAISS add.
+        
+        Args:
+            file_paths: Paths to the media files
+            embeddings: (N, D) array (or list) of embedding vectors in file_paths order
+            file_types: Type of each media file ("image" or "video")
+        """
+        if not file_paths:
+            return
+        
+        # Copied so normalizing in place never touches the caller's arrays
+        rows = np.array(embeddings, dtype=np.float32, order='C').reshape(len(file_paths), -1)
+        embedding_dim = rows.shape[1]
+        
+        # An empty index adopts the dimension of the first embeddings added
+        if self.faiss_index is None or (self.faiss_index.ntotal == 0 and embedding_dim != self.dimension):
+            self._create_new_index(embedding_dim)
+        
+        if embedding_dim != self.dimension:
+            print(f"Skipping {len(file_paths)} files: embedding dimension mismatch ({embedding_dim} != {self.dimension})")
+            return
+        
+        faiss.normalize_L2(rows)
+        self.faiss_index.add(rows)
+        self._gpu_index = None
+        
+        # One timestamp per batch
+        self.paths.extend(file_paths)
+        self.types.extend(_type_code(file_type) for file_type in file_types)
+        self.added.extend([datetime.now().timestamp()] * len(file_paths))
     
-    def search(self, query_embedding: np.ndarray, k: int = 10) -> List[Dict]:
+    def _search_index(self):
+        """
+        Get the index to run queries on: a GPU copy when GPU FAISS is available.
+        
+        Returns:
+            FAISS index to search
+        """
+        if self._gpu_resources is None:
+            return self.faiss_index
+        
+        if self._gpu_index is None:
+            try:
+                if self._resolved_index_type() == "cagra" and self.faiss_index.ntotal >= ANN_MIN_ENTRIES:
+                    self._gpu_index = self._build_cagra_index()
+                else:
+                    options = faiss.GpuClonerOptions()
+                    if CUVS_AVAILABLE and hasattr(options, "use_cuvs"):
+                        # cuVS kernels for IVF search
+                        options.use_cuvs = True
+                    # Flat and IVF vectors are stored as float16 on the GPU
+                    options.useFloat16 = FP16_STORAGE
+                    self._gpu_index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, self.faiss_index, options)
+                self._configure_search(self._gpu_index)
+            except Exception as e:
+                # Not every index type has a GPU implementation (e.g. HNSW)
+                print(f"GPU search unavailable for this index, using CPU: {e}")
+                self._gpu_resources = None
+                return self.faiss_index
+        return self._gpu_index
+    
+    def _build_cagra_index(self):
+        """
+        Build a CAGRA graph index on the GPU from every vector in the CPU index.
+        
+        Returns:
+            GpuIndexCagra ready to search
+        """
+        vectors = self.faiss_index.reconstruct_n(0, self.faiss_index.ntotal)
+        index = faiss.GpuIndexCagra(self._gpu_resources, self.dimension, faiss.METRIC_INNER_PRODUCT)
+        # For CAGRA, train builds the graph over the dataset
+        index.train(vectors)
+        return index
+    
+    def search(self, query_embedding: np.ndarray, k: int = 10, nprobe: int = None,
+               ef: int = None) -> List[Dict]:
         """
         Search for similar media files.
         
         Args:
             query_embedding: Query embedding vector
             k: Number of results to return
+            nprobe: IVF lists to probe, trading speed for recall (default IVF_NPROBE);
+                ignored by other index types
+            ef: HNSW candidates explored (default max(HNSW_EF_SEARCH, 2 * k)); ignored
+                by other index types
             
         Returns:
             List of metadata dictionaries for matching files
         """
+        ids, similarities, squared_distances = self.search_arrays(query_embedding, k, nprobe, ef)
+        
+        results = []
+        for idx, squared_distance, cosine_similarity in zip(ids.tolist(), squared_distances.tolist(),
+                                                            similarities.tolist()):
+            result = self._entry(idx)
+            result['distance'] = squared_distance
+            result['similarity'] = cosine_similarity
+            results.append(result)
+        
+        return results
+    
+    def search_arrays(self, query_embedding: np.ndarray, k: int = 10,
+                      nprobe: int = None, ef: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Search for similar media files, returning arrays instead of result dictionaries.
+        
+        Rows index the metadata columns (paths, types, added), so callers that only need
+        some fields can skip building a dictionary per hit.
+        
+        Args:
+            query_embedding: Query embedding vector
+            k: Number of results to return
+            nprobe: IVF lists to probe (see search)
+            ef: HNSW candidates explored (see search)
+            
+        Returns:
+            (rows, cosine similarities, squared L2 distances), best match first
+        """
+        no_results = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32))
         if self.faiss_index.ntotal == 0:
-            return []
+            return no_results
         
         # Ensure embedding is the right shape
         if query_embedding.ndim > 1:
@@ -128,59 +633,150 @@ class MediaSearchIndex:
         
         if query_embedding.shape[0] != self.dimension:
             print(f"Query embedding dimension mismatch: {query_embedding.shape[0]} != {self.dimension}")
-            return []
+            return no_results
         
-        # Search - use cosine similarity for normalized embeddings (more accurate)
+        # Search with the normalized query; results come back sorted best-first
         query_float32 = query_embedding.astype('float32').reshape(1, -1)
+        faiss.normalize_L2(query_float32)
+        index = self._search_index()
+        if index is not self.faiss_index:
+            k = min(k, GPU_MAX_K)
+        k = min(k, self.faiss_index.ntotal)
+        if CUVS_AVAILABLE and isinstance(index, faiss.GpuIndexCagra):
+            # CAGRA keeps itopk_size candidates internally, which must cover k
+            params = faiss.SearchParametersCagra()
+            params.itopk_size = max(64, k)
+            distances, indices = index.search(query_float32, k, params=params)
+        elif isinstance(index, faiss.IndexHNSW):
+            # efSearch below k would return fewer than k results
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = max(ef, k) if ef is not None else max(HNSW_EF_SEARCH, 2 * k)
+            distances, indices = index.search(query_float32, k, params=params)
+        elif nprobe is not None and hasattr(index, "nprobe"):
+            params = faiss.SearchParametersIVF()
+            params.nprobe = nprobe
+            distances, indices = index.search(query_float32, k, params=params)
+        else:
+            distances, indices = index.search(query_float32, k)
         
-        # For normalized embeddings, cosine similarity = 1 - (L2 distance^2 / 2)
-        # But FAISS IndexFlatL2 returns squared L2 distance, so we convert properly
-        distances, indices = self.faiss_index.search(query_float32, min(k * 2, self.faiss_index.ntotal))
+        # Inner product indexes return cosine similarity directly; indexes saved before the
+        # switch to inner product return squared L2, and distance^2 = 2(1 - cosine_similarity)
+        if self.faiss_index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            similarities = distances[0]
+            squared_distances = 2.0 - 2.0 * similarities
+        else:
+            squared_distances = distances[0]
+            similarities = np.maximum(0.0, 1.0 - squared_distances / 2.0)
         
-        # Build results with better similarity calculation
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.metadata):
-                result = self.metadata[idx].copy()
-                # For normalized embeddings, distance^2 = 2(1 - cosine_similarity)
-                # So cosine_similarity = 1 - (distance^2 / 2)
-                squared_distance = float(distances[0][i])
-                cosine_similarity = max(0.0, 1.0 - (squared_distance / 2.0))
-                result['distance'] = squared_distance
-                result['similarity'] = cosine_similarity
-                results.append(result)
-        
-        # Sort by similarity (descending) and filter low-confidence results
-        results.sort(key=lambda x: x['similarity'], reverse=True)
-        
-        # Filter results below similarity threshold (0.3 = 30% similarity)
+        # Filter results below similarity threshold (0.3 = 30% similarity); approximate
+        # indexes pad missing results with -1. Results are already sorted best-first.
         min_similarity = 0.3
-        filtered_results = [r for r in results if r['similarity'] >= min_similarity]
+        ids = indices[0]
+        keep = np.flatnonzero((ids >= 0) & (ids < len(self.paths)) & (similarities >= min_similarity))
         
-        # Return top k results
-        return filtered_results[:k]
+        return ids[keep], similarities[keep], squared_distances[keep]
     
     def save(self):
-        """Save the index to disk."""
+        """
+        Save the index to disk.
+        
+        Exact inner-product indexes append their new vectors to the vectors file and are
+        rebuilt from it on load; other indexes are written to a temporary FAISS file and
+        renamed over the old one. The metadata log is brought up to date first, so an
+        interrupted save leaves at worst extra log entries, which the next load drops.
+        """
+        if self.read_only:
+            print("Index opened read-only; not saving")
+            return
+        
         try:
-            # Save FAISS index
-            faiss.write_index(self.faiss_index, self.faiss_index_file)
+            self._maybe_upgrade_index()
             
             # Save metadata
-            with open(self.metadata_file, 'w') as f:
-                json.dump(self.metadata, f, indent=2)
+            self._write_metadata()
+            
+            # Save vectors or FAISS index (indexes saved before inner product use L2 and
+            # unnormalized vectors, so they keep the FAISS file)
+            if self._is_exact(self.faiss_index) and self.faiss_index.metric_type == faiss.METRIC_INNER_PRODUCT:
+                self._write_vectors()
+                storage, stale_file = "vectors", self.faiss_index_file
+            else:
+                faiss_tmp = self.faiss_index_file + ".tmp"
+                faiss.write_index(self.faiss_index, faiss_tmp)
+                os.replace(faiss_tmp, self.faiss_index_file)
+                self._stored_vectors = None
+                storage, stale_file = "faiss", self.vectors_file
+            
+            # The requested type is kept for later rebuilds, along with where the vectors live
+            config_tmp = self.config_file + ".tmp"
+            with open(config_tmp, 'w') as f:
+                json.dump({"index_type": self.index_type, "storage": storage,
+                           "dimension": self.dimension}, f)
+            os.replace(config_tmp, self.config_file)
+            if os.path.exists(stale_file):
+                os.remove(stale_file)
             
-            print(f"Index saved with {len(self.metadata)} entries")
+            print(f"Index saved with {len(self.paths)} entries")
         except Exception as e:
             print(f"Error saving index: {e}")
     
     def get_stats(self) -> Dict:
         """Get statistics about the index."""
+        types = np.frombuffer(self.types, dtype=np.uint8)
         return {
-            "total_entries": len(self.metadata),
-            "images": sum(1 for m in self.metadata if m.get("file_type") == "image"),
-            "videos": sum(1 for m in self.metadata if m.get("file_type") == "video"),
+            "total_entries": len(self.paths),
+            "images": int(np.count_nonzero(types == FILE_TYPES.index("image"))),
+            "videos": int(np.count_nonzero(types == FILE_TYPES.index("video"))),
             "dimension": self.dimension
         }
 
 
+class _MappedFlatIndex:
+    """
+    Exact inner-product search over a memory-mapped vectors file.
+    
+    Provides the parts of the FAISS index interface MediaSearchIndex searches with
+    (d, ntotal, metric_type, search); it can't be added to.
+    """
+    
+    def __init__(self, vectors: np.ndarray):
+        """
+        Args:
+            vectors: (N, D) float32 array of normalized vectors, usually a np.memmap
+        """
+        self.vectors = vectors
+        self.d = vectors.shape[1]
+        self.ntotal = vectors.shape[0]
+        self.metric_type = faiss.METRIC_INNER_PRODUCT
+    
+    def search(self, queries: np.ndarray, k: int):
+        """
+        Find the k vectors with the highest inner product for each query.
+        
+        Args:
+            queries: (Q, D) float32 queries
+            k: Number of results per query
+            
+        Returns:
+            (Q, k) similarities and (Q, k) row ids, best match first
+        """
+        return faiss.knn(queries, self.vectors, k, metric=faiss.METRIC_INNER_PRODUCT)
+
+
+def _type_code(file_type: str) -> int:
+    """Map a media type to its FILE_TYPES code, treating unknown types as images."""
+    return FILE_TYPES.index(file_type) if file_type in FILE_TYPES else 0
+
+
+def _dumps_line(entry: Dict) -> bytes:
+    """Serialize a metadata entry as one compact JSON line."""
+    if orjson is not None:
+        return orjson.dumps(entry) + b"\n"
+    return json.dumps(entry, separators=(',', ':')).encode('utf-8') + b"\n"
+
+
+def _loads(line: bytes) -> Dict:
+    """Parse one metadata log line."""
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
@@ -1,116 +1,806 @@
 """
 Web application for media search and management.
 """
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, send_file
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
+from werkzeug.utils import safe_join
 import os
+import base64
+import json
+import mimetypes
+import http.client
+import queue
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+import numpy as np
 from ai_analyzer import MediaAnalyzer
-from search_index import MediaSearchIndex
+from search_index import MediaSearchIndex, FILE_TYPES
+from media_organizer import iter_media, ALL_EXTENSIONS
+
+# orjson is optional: it serializes responses several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# msgpack is optional: it enables the binary /api/search.msgpack endpoint
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Most recent query embeddings kept by the query encoder
+QUERY_CACHE_SIZE = 4096
+
+# Concurrent queries are encoded together, up to this many per text-encoder pass,
+# waiting at most QUERY_BATCH_WAIT seconds for a batch to fill
+QUERY_BATCH_SIZE = 16
+QUERY_BATCH_WAIT = 0.005
+
+# Optional embedding sidecar with a Text-Embeddings-Inference style API (POST /embed with
+# {"inputs": [...]}), e.g. http://localhost:8080. It must serve the CLIP text encoder the
+# index was built with; when set and reachable, the models are not loaded in-process
+EMBED_URL = os.environ.get("PHAI_EMBED_URL")
+
+# Seconds to wait for the embedding sidecar
+EMBED_TIMEOUT = 10
+
+# Opt-in semantic result cache: with PHAI_SEMANTIC_CACHE_THRESHOLD set, a query whose
+# embedding has at least that cosine similarity to a recent query reuses its results.
+# CLIP text embeddings of queries differing in one word ("red car" / "blue car") can
+# score above 0.9, so thresholds below SEMANTIC_CACHE_MIN_THRESHOLD are raised to it
+SEMANTIC_CACHE_THRESHOLD = os.environ.get("PHAI_SEMANTIC_CACHE_THRESHOLD")
+SEMANTIC_CACHE_MIN_THRESHOLD = 0.99
+
+# Pairs of distinct queries that must never share a semantic cache entry; checked at startup
+SEMANTIC_CACHE_PROBES = (("red car", "blue car"), ("dog on beach", "cat on beach"), ("a man", "a woman"))
+
+# Result lists kept by the semantic cache, and how long (seconds) each stays valid
+SEMANTIC_CACHE_SIZE = 1024
+SEMANTIC_CACHE_TTL = 300
+
+# Query encodes and searches run by initialize_app so the first request doesn't pay for
+# lazy initialization, CUDA graph replay setup or page faults on a memory-mapped index
+WARMUP_ROUNDS = 3
+
+# Seconds before the set of media files under the media folder is rescanned
+KNOWN_PATHS_TTL = 60
+
+# Threads checking, in parallel, result paths missing from that set
+EXISTS_WORKERS = 8
+
+# Behind nginx, media under the media folder can be handed off with X-Accel-Redirect to
+# this internal location (e.g. "location /internal_media/ { internal; alias /media/; }"),
+# so nginx sends the bytes with sendfile() instead of Python
+ACCEL_REDIRECT_PREFIX = os.environ.get("PHAI_ACCEL_REDIRECT_PREFIX")
+
+# Seconds /api/stats reuses computed statistics while the index size is unchanged
+STATS_TTL = 5
+
+# Media files don't change while they are indexed, so browsers and proxies may keep them
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Element types accepted for base64-encoded query embeddings
+EMBEDDING_DTYPES = ("float16", "float32")
+
+# Most results a search request may ask for; larger limits are clamped
+MAX_SEARCH_LIMIT = 200
+
+# Largest accepted request body; a query, or an embedding sent as a JSON list, fits easily
+MAX_REQUEST_SIZE = 64 * 1024
 
 app = Flask(__name__)
 CORS(app)
 
+# Werkzeug answers 413 to larger bodies before they are read
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_SIZE
+
+# Behind Apache with mod_xsendfile (or lighttpd), send_file only emits an X-Sendfile header
+app.use_x_sendfile = bool(os.environ.get("PHAI_X_SENDFILE"))
+
 # Global instances
 analyzer = None
 search_index = None
+query_encoder = None
+semantic_cache = None
 media_base_path = None
 
+# media_base_path normalized, and made absolute, once at startup
+media_base_norm = None
+media_base_abs = None
+
+# Absolute paths of indexed files, memoized since the working directory never changes
+_abspath = lru_cache(maxsize=65536)(os.path.abspath)
+
+# Absolute paths of the media files under media_base_path, so search results are checked
+# without a stat() each; rescanned in the background once older than KNOWN_PATHS_TTL
+known_paths = frozenset()
+known_paths_scanned_at = 0.0
+_known_paths_lock = threading.Lock()
+_exists_pool = ThreadPoolExecutor(max_workers=EXISTS_WORKERS)
+
+# (computed at, index size, stats) of the last /api/stats answer
+_stats_cache = None
+
+
+class BatchedEncoder:
+    """
+    Encodes search queries on a background thread, batching concurrent requests.
+    
+    Queries are normalized (stripped and lowercased) and looked up in an LRU cache
+    first. Misses are queued; the worker thread collects up to max_batch of them,
+    waiting at most max_wait seconds after the first, and encodes them in one call.
+    Identical queries in flight at the same time share one encode. Only embeddings of
+    the index's dimension are cached, so fallback-encoder results are retried.
+    """
+    
+    def __init__(self, encode_batch: Callable[[List[str]], List[np.ndarray]],
+                 max_batch: int = QUERY_BATCH_SIZE, max_wait: float = QUERY_BATCH_WAIT,
+                 cache_size: int = QUERY_CACHE_SIZE, cache_dim: Optional[int] = None):
+        """
+        Start the encoder thread.
+        
+        Args:
+            encode_batch: Function encoding a list of queries into a list of embeddings
+            max_batch: Most queries encoded per call
+            max_wait: Seconds to wait for more queries once one is pending
+            cache_size: Number of query embeddings kept
+            cache_dim: Dimension of the embeddings worth caching (the index's); others,
+                e.g. from the analyzer's sentence-transformer fallback, are returned
+                but not cached. None caches everything.
+        """
+        self.encode_batch = encode_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self.cache_dim = cache_dim
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+    
+    def submit(self, query: str) -> Future:
+        """
+        Request the embedding of a query.
+        
+        Args:
+            query: Natural language search query
+            
+        Returns:
+            Future resolving to the (read-only) query embedding
+        """
+        key = query.strip().lower()
+        with self._lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+                future = Future()
+                future.set_result(embedding)
+                return future
+            
+            future = self._pending.get(key)
+            if future is None:
+                future = Future()
+                self._pending[key] = future
+                self._queue.put(key)
+        return future
+    
+    def encode(self, query: str) -> np.ndarray:
+        """Encode a query, blocking until its batch is done."""
+        return self.submit(query).result()
+    
+    def _run(self):
+        """Worker loop: collect a batch of queued queries and encode it."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                embeddings = self.encode_batch(batch)
+            except Exception as e:
+                with self._lock:
+                    futures = [self._pending.pop(key) for key in batch]
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            
+            with self._lock:
+                futures = [self._pending.pop(key) for key in batch]
+                for key, embedding in zip(batch, embeddings):
+                    if self.cache_dim is not None and embedding.shape[0] != self.cache_dim:
+                        continue
+                    self._cache[key] = embedding
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            for future, embedding in zip(futures, embeddings):
+                future.set_result(embedding)
+
+
+class RemoteTextEncoder:
+    """
+    Encodes queries with an embedding sidecar over one persistent HTTP connection.
+    
+    Only called from the BatchedEncoder thread, so a single keep-alive connection is
+    reused without locking; the sidecar batches across requests on its side too.
+    """
+    
+    def __init__(self, url: str, timeout: float = EMBED_TIMEOUT):
+        """
+        Open the connection.
+        
+        Args:
+            url: Base URL of the sidecar, e.g. http://localhost:8080
+            timeout: Seconds to wait for a response
+        """
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._connect = lambda: connection_class(parts.netloc, timeout=timeout)
+        self._path = parts.path.rstrip('/') + "/embed"
+        self._connection = self._connect()
+    
+    def __call__(self, queries: List[str]) -> List[np.ndarray]:
+        """
+        Encode queries, reconnecting once if the kept-alive connection was dropped.
+        
+        Args:
+            queries: Normalized search queries
+            
+        Returns:
+            L2-normalized, read-only float32 embeddings in queries order
+        """
+        body = json.dumps({"inputs": queries})
+        for attempt in range(2):
+            try:
+                self._connection.request("POST", self._path, body, {"Content-Type": "application/json"})
+                response = self._connection.getresponse()
+                payload = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                self._connection.close()
+                self._connection = self._connect()
+                if attempt:
+                    raise
+        
+        if response.status != 200:
+            raise RuntimeError(f"Embedding service returned {response.status}: {payload[:200]!r}")
+        
+        embeddings = np.asarray(json.loads(payload), dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings.setflags(write=False)
+        return list(embeddings)
+
+
+class SemanticCache:
+    """
+    Caches search results by query embedding, so near-identical queries skip the index search.
+    
+    Past query embeddings are kept as rows of a small matrix and matched with one
+    matrix-vector product; the least recently used entry is replaced when full. Entries
+    expire after ttl seconds, and the whole cache is dropped when the index changes.
+    """
+    
+    def __init__(self, dimension: int, threshold: float = SEMANTIC_CACHE_MIN_THRESHOLD,
+                 capacity: int = SEMANTIC_CACHE_SIZE, ttl: float = SEMANTIC_CACHE_TTL):
+        """
+        Create an empty cache.
+        
+        Args:
+            dimension: Query embedding dimension (the index's)
+            threshold: Minimum cosine similarity between queries for a hit
+            capacity: Number of result lists kept
+            ttl: Seconds a result list stays valid
+        """
+        self.dimension = dimension
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index_size = None
+        self.clear()
+    
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._embeddings = np.zeros((self.capacity, self.dimension), dtype=np.float32)
+            self._entries = []
+            self._last_used = np.zeros(self.capacity)
+    
+    def sync(self, index_size: int):
+        """Drop every entry if the index size changed since the last call."""
+        if index_size != self._index_size:
+            self.clear()
+            self._index_size = index_size
+    
+    def lookup(self, query_embedding: np.ndarray, limit: int) -> Optional[List]:
+        """
+        Find the results of a similar recent query.
+        
+        Args:
+            query_embedding: Normalized query embedding
+            limit: Number of results requested
+            
+        Returns:
+            Cached results (at most limit), or None on a miss
+        """
+        with self._lock:
+            count = len(self._entries)
+            if count == 0 or query_embedding.shape[0] != self.dimension:
+                return None
+            similarities = self._embeddings[:count] @ query_embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            
+            results, cached_limit, stored_at = self._entries[best]
+            now = time.monotonic()
+            # Entries cached for a smaller limit can't answer a larger request
+            if now - stored_at > self.ttl or cached_limit < limit:
+                return None
+            self._last_used[best] = now
+            return results[:limit]
+    
+    def store(self, query_embedding: np.ndarray, limit: int, results: List):
+        """
+        Remember the results of a query.
+        
+        Args:
+            query_embedding: Normalized query embedding
+            limit: Number of results that were requested
+            results: Formatted results
+        """
+        if query_embedding.shape[0] != self.dimension:
+            return
+        with self._lock:
+            now = time.monotonic()
+            entry = (results, limit, now)
+            if len(self._entries) < self.capacity:
+                slot = len(self._entries)
+                self._entries.append(entry)
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._entries[slot] = entry
+            self._embeddings[slot] = query_embedding
+            self._last_used[slot] = now
+
 
 def initialize_app(index_path: str = "./data/index", media_path: str = None):
     """Initialize the web application."""
-    global analyzer, search_index, media_base_path
+    global analyzer, search_index, query_encoder, semantic_cache, media_base_path, media_base_norm, media_base_abs
     
-    analyzer = MediaAnalyzer()
-    search_index = MediaSearchIndex(index_path)
+    # The web app never writes the index, so it is memory-mapped and shared between workers
+    search_index = MediaSearchIndex(index_path, read_only=True)
+    query_encoder = _remote_query_encoder() if EMBED_URL else None
+    if query_encoder is None:
+        # The web app only encodes queries, so it trades a checked sliver of accuracy for
+        # int8 text encoding on CPU; the GUI and CLI keep the float32 encoder
+        analyzer = MediaAnalyzer(quantize_text=True)
+        query_encoder = BatchedEncoder(analyzer.encode_text_queries, cache_dim=search_index.dimension)
+    semantic_cache = _semantic_cache()
     media_base_path = media_path or "./organized_media"
+    media_base_norm = os.path.normpath(media_base_path)
+    media_base_abs = os.path.abspath(media_base_path)
+    # Build the set of servable absolute paths now rather than on the first media request
+    search_index.warm_known_abs_paths()
+    _scan_known_paths()
+    _warmup()
     
     print("Web application initialized")
 
 
+def _semantic_cache() -> Optional[SemanticCache]:
+    """
+    Create the semantic result cache if it is enabled and safe for the query encoder.
+    
+    Returns:
+        SemanticCache, or None if PHAI_SEMANTIC_CACHE_THRESHOLD is unset or two distinct
+        SEMANTIC_CACHE_PROBES queries would share an entry at the threshold
+    """
+    if not SEMANTIC_CACHE_THRESHOLD or search_index.dimension is None:
+        return None
+    threshold = max(float(SEMANTIC_CACHE_THRESHOLD), SEMANTIC_CACHE_MIN_THRESHOLD)
+    
+    try:
+        for first, second in SEMANTIC_CACHE_PROBES:
+            first_embedding, second_embedding = query_encoder.encode_batch([first, second])
+            similarity = float(np.dot(first_embedding, second_embedding))
+            if similarity >= threshold:
+                print(f"Semantic cache disabled: {first!r} and {second!r} have similarity "
+                      f"{similarity:.3f} >= {threshold}")
+                return None
+    except Exception as e:
+        print(f"Semantic cache disabled, probe queries failed: {e}")
+        return None
+    
+    print(f"Semantic cache enabled (threshold {threshold})")
+    return SemanticCache(search_index.dimension, threshold)
+
+
+def _warmup():
+    """Run a few query encodes and searches, logging their latencies."""
+    encode_times = []
+    search_times = []
+    try:
+        for i in range(WARMUP_ROUNDS):
+            # Distinct queries, so the encoder caches don't short-circuit the model
+            start = time.perf_counter()
+            query_embedding = query_encoder.encode_batch([f"warmup query {i}"])[0]
+            encode_times.append(time.perf_counter() - start)
+            
+            start = time.perf_counter()
+            search_index.search_arrays(query_embedding, k=10)
+            search_times.append(time.perf_counter() - start)
+    except Exception as e:
+        print(f"Warmup failed: {e}")
+        return
+    
+    for name, times in (("encode", encode_times), ("search", search_times)):
+        p50, p99 = np.percentile(np.array(times) * 1000, [50, 99])
+        print(f"Warmup {name}: p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+
+
+def _remote_query_encoder() -> Optional[BatchedEncoder]:
+    """
+    Connect to the embedding sidecar and check that it matches the index.
+    
+    Returns:
+        Query encoder backed by the sidecar, or None if it is unreachable or its
+        embedding dimension differs from the index
+    """
+    try:
+        encoder = RemoteTextEncoder(EMBED_URL)
+        dimension = encoder(["a photo"])[0].shape[0]
+    except Exception as e:
+        print(f"Embedding service at {EMBED_URL} unavailable, loading models in-process: {e}")
+        return None
+    
+    if search_index.dimension is not None and dimension != search_index.dimension:
+        print(f"Embedding service dimension {dimension} doesn't match the index ({search_index.dimension}), "
+              f"loading models in-process")
+        return None
+    
+    print(f"Encoding queries with the embedding service at {EMBED_URL}")
+    return BatchedEncoder(encoder, cache_dim=search_index.dimension)
+
+
+def _scan_known_paths():
+    """Rebuild the set of media files under media_base_path."""
+    global known_paths, known_paths_scanned_at
+    
+    root = media_base_abs
+    scanned_at = time.monotonic()
+    known_paths = frozenset(path for path, _ in iter_media(root, ALL_EXTENSIONS))
+    known_paths_scanned_at = scanned_at
+
+
+def _refresh_known_paths():
+    """Start a background rescan if the known paths are stale and no rescan is running."""
+    if time.monotonic() - known_paths_scanned_at < KNOWN_PATHS_TTL:
+        return
+    if not _known_paths_lock.acquire(blocking=False):
+        return
+    
+    def rescan():
+        try:
+            _scan_known_paths()
+        except Exception as e:
+            print(f"Error scanning media folder: {e}")
+        finally:
+            _known_paths_lock.release()
+    
+    threading.Thread(target=rescan, daemon=True).start()
+
+
+def _paths_exist(paths: List[str]) -> List[bool]:
+    """
+    Check which absolute paths exist.
+    
+    Paths in the known set count as existing; the rest (files outside the media folder,
+    or added since the last scan) are stat()ed in parallel.
+    
+    Args:
+        paths: Absolute file paths
+        
+    Returns:
+        Existence flag per path
+    """
+    _refresh_known_paths()
+    current = known_paths
+    unknown = [path for path in paths if path not in current]
+    found = dict(zip(unknown, _exists_pool.map(os.path.exists, unknown)))
+    return [path in current or found[path] for path in paths]
+
+
+def _decode_embedding(value, dtype: str = "float16") -> np.ndarray:
+    """
+    Decode a query embedding sent by the client.
+    
+    Args:
+        value: Raw little-endian floats (bytes, or a base64 string), or a list of numbers
+        dtype: Element type of the base64 bytes, one of EMBEDDING_DTYPES
+        
+    Returns:
+        Normalized float32 embedding
+        
+    Raises:
+        ValueError: If the embedding is malformed or has the wrong dimension
+    """
+    if isinstance(value, (str, bytes)):
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"dtype must be one of {', '.join(EMBEDDING_DTYPES)}")
+        raw = value
+        if isinstance(value, str):
+            try:
+                raw = base64.b64decode(value, validate=True)
+            except ValueError:
+                raise ValueError("embedding is not valid base64")
+        element_type = np.dtype(dtype).newbyteorder('<')
+        if len(raw) % element_type.itemsize:
+            raise ValueError(f"embedding byte length is not a multiple of {element_type.itemsize}")
+        embedding = np.frombuffer(raw, dtype=element_type).astype(np.float32)
+    elif isinstance(value, list):
+        embedding = np.asarray(value, dtype=np.float32)
+    else:
+        raise ValueError("embedding must be bytes, a base64 string or a list of numbers")
+    
+    if embedding.ndim != 1 or embedding.shape[0] != search_index.dimension:
+        raise ValueError(f"embedding must have {search_index.dimension} dimensions")
+    norm = np.linalg.norm(embedding)
+    if not np.isfinite(norm) or norm == 0:
+        raise ValueError("embedding must be finite and non-zero")
+    return embedding / norm
+
+
+def _json_body() -> dict:
+    """
+    Parse the request body as a JSON object, with orjson when it is installed.
+    
+    The body is read once without being cached on the request.
+    
+    Returns:
+        Decoded object
+        
+    Raises:
+        ValueError: If the body is not a JSON object
+    """
+    body = request.get_data(cache=False)
+    data = orjson.loads(body) if orjson is not None else json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError("Body must be a JSON object")
+    return data
+
+
+def ojsonify(obj, status: int = 200) -> Response:
+    """
+    Build a JSON response, serialized with orjson when it is installed.
+    
+    Args:
+        obj: JSON-serializable object (NumPy scalars and arrays too, with orjson)
+        status: HTTP status code
+        
+    Returns:
+        Response with an application/json body
+    """
+    if orjson is not None:
+        return Response(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY), status=status,
+                        mimetype='application/json')
+    response = jsonify(obj)
+    response.status_code = status
+    return response
+
+
+def _accel_redirect(full_path: str) -> Optional[Response]:
+    """
+    Build an X-Accel-Redirect response for a file under the media folder.
+    
+    Args:
+        full_path: Normalized path of the file to serve
+        
+    Returns:
+        Header-only response for nginx to fill in, or None if offloading is off or the
+        file is outside the media folder
+    """
+    if not ACCEL_REDIRECT_PREFIX:
+        return None
+    
+    root = media_base_abs
+    abs_path = os.path.abspath(full_path)
+    if os.path.commonpath([root, abs_path]) != root:
+        return None
+    
+    rel_path = os.path.relpath(abs_path, root).replace(os.sep, '/')
+    response = Response(mimetype=mimetypes.guess_type(abs_path)[0] or 'application/octet-stream')
+    response.headers['X-Accel-Redirect'] = ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(rel_path)
+    return response
+
+
 @app.route('/')
 def index():
     """Serve the main page."""
     return render_template('index.html')
 
 
+def _run_search(data: dict) -> Tuple[dict, int]:
+    """
+    Run a search request.
+    
+    The request carries either a text 'query', or a precomputed CLIP 'embedding' (base64 of
+    raw floats whose element type is given by 'dtype', float16 by default, raw bytes over
+    msgpack, or a list) which skips the text encoder.
+    
+    Args:
+        data: Decoded request body
+        
+    Returns:
+        Tuple of (response object, HTTP status code)
+    """
+    query = data.get('query', '')
+    try:
+        limit = max(1, min(int(data.get('limit', 10)), MAX_SEARCH_LIMIT))
+    except (TypeError, ValueError):
+        return {'error': 'limit must be an integer'}, 400
+    
+    if data.get('embedding') is not None:
+        try:
+            query_embedding = _decode_embedding(data['embedding'], data.get('dtype', 'float16'))
+        except ValueError as e:
+            return {'error': str(e)}, 400
+    elif not query:
+        return {'error': 'Query is required'}, 400
+    else:
+        # Encode query (cached, and batched with concurrent requests)
+        query_embedding = query_encoder.encode(query)
+    
+    # Near-identical recent queries reuse their results
+    cached = None
+    if semantic_cache is not None:
+        semantic_cache.sync(search_index.faiss_index.ntotal)
+        cached = semantic_cache.lookup(query_embedding, limit)
+    if cached is not None:
+        return {
+            'results': cached,
+            'query': query,
+            'count': len(cached)
+        }, 200
+    
+    # Search
+    rows, similarities, distances = search_index.search_arrays(query_embedding, k=limit)
+    rows = rows.tolist()
+    similarities = np.round(similarities, 3).tolist()
+    distances = np.round(distances, 3).tolist()
+    
+    # Add file existence check and prepare response (absolute paths for serving)
+    abs_paths = [_abspath(search_index.paths[row]) for row in rows]
+    file_types = [FILE_TYPES[search_index.types[row]] for row in rows]
+    formatted_results = [
+        {'file_path': abs_path, 'file_type': file_type, 'similarity': similarity, 'distance': distance}
+        for abs_path, file_type, similarity, distance, exists
+        in zip(abs_paths, file_types, similarities, distances, _paths_exist(abs_paths))
+        if exists
+    ]
+    if semantic_cache is not None:
+        semantic_cache.store(query_embedding, limit, formatted_results)
+    
+    return {
+        'results': formatted_results,
+        'query': query,
+        'count': len(formatted_results)
+    }, 200
+
+
 @app.route('/api/search', methods=['POST'])
 def search():
     """Handle semantic search queries."""
     try:
-        data = request.json
-        query = data.get('query', '')
-        limit = data.get('limit', 10)
-        
-        if not query:
-            return jsonify({'error': 'Query is required'}), 400
-        
-        # Encode query
-        query_embedding = analyzer.encode_text_query(query)
-        
-        # Search
-        results = search_index.search(query_embedding, k=limit)
-        
-        # Add file existence check and prepare response
-        formatted_results = []
-        for result in results:
-            file_path = result['file_path']
-            if os.path.exists(file_path):
-                # Use absolute path for serving
-                abs_path = os.path.abspath(file_path)
-                formatted_results.append({
-                    'file_path': abs_path,
-                    'file_type': result['file_type'],
-                    'similarity': round(result['similarity'], 3),
-                    'distance': round(result['distance'], 3)
-                })
-        
-        return jsonify({
-            'results': formatted_results,
-            'query': query,
-            'count': len(formatted_results)
-        })
+        try:
+            data = _json_body()
+        except ValueError:
+            return ojsonify({'error': 'Invalid JSON body'}, 400)
+        return ojsonify(*_run_search(data))
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        return ojsonify({'error': str(e)}, 500)
+
+
+@app.route('/api/search.msgpack', methods=['POST'])
+def search_msgpack():
+    """Handle semantic search queries with msgpack bodies, for internal high-QPS callers."""
+    if msgpack is None:
+        return ojsonify({'error': 'msgpack is not installed'}, 501)
     
+    try:
+        body = request.get_data(cache=False)
+        try:
+            data = msgpack.unpackb(body, raw=False)
+        except Exception:
+            data = None
+        if not isinstance(data, dict):
+            obj, status = {'error': 'Body must be a msgpack map'}, 400
+        else:
+            obj, status = _run_search(data)
+    except HTTPException:
+        raise
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        obj, status = {'error': str(e)}, 500
+    
+    return Response(msgpack.packb(obj, use_bin_type=True), status=status, mimetype='application/msgpack')
 
 
 @app.route('/api/media/<path:file_path>')
 def serve_media(file_path: str):
-    """Serve media files."""
+    """
+    Serve media files.
+    
+    Relative paths are resolved inside the media folder with safe_join, which rejects
+    traversal; absolute paths (as returned by search) are served only if they are
+    indexed files. Responses are conditional (send_file sets an ETag from the file's
+    mtime and size), so browsers get 304s and video seeking uses Range requests, and
+    marked cacheable.
+    """
     try:
-        # Decode the file path
-        file_path = file_path.replace('%2F', '/').replace('%5C', '\\')
-        
-        # Check if it's an absolute path or relative
+        # Flask has already URL-decoded the path
         if os.path.isabs(file_path):
             full_path = os.path.normpath(file_path)
+            if full_path not in search_index.known_abs_paths:
+                return ojsonify({'error': 'Access denied'}, 403)
         else:
-            full_path = os.path.join(media_base_path, file_path)
-            full_path = os.path.normpath(full_path)
+            full_path = safe_join(media_base_norm, file_path)
+            if full_path is None:
+                return ojsonify({'error': 'Access denied'}, 403)
         
-        # Security: ensure file is within media base path (for relative paths)
-        # or allow absolute paths if they exist
-        if not os.path.isabs(file_path):
-            if not full_path.startswith(os.path.normpath(media_base_path)):
-                return jsonify({'error': 'Access denied'}), 403
-        
-        if os.path.exists(full_path):
-            return send_file(full_path)
-        else:
-            return jsonify({'error': 'File not found'}), 404
+        if not os.path.isfile(full_path):
+            return ojsonify({'error': 'File not found'}, 404)
+        response = _accel_redirect(full_path) or send_file(full_path, conditional=True)
+        response.headers['Cache-Control'] = MEDIA_CACHE_CONTROL
+        return response
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}, 500)
 
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get index statistics."""
+    global _stats_cache
+    
     try:
+        now = time.monotonic()
+        ntotal = search_index.faiss_index.ntotal
+        cached = _stats_cache
+        if cached is not None and now - cached[0] < STATS_TTL and cached[1] == ntotal:
+            return ojsonify(cached[2])
+        
         stats = search_index.get_stats()
-        return jsonify(stats)
+        _stats_cache = (now, ntotal, stats)
+        return ojsonify(stats)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}, 500)
+
+
+# WSGI servers import the module without running __main__, so PHAI_AUTOINIT=1 initializes
+# on import from PHAI_INDEX_PATH and PHAI_MEDIA_PATH, e.g.
+#   PHAI_AUTOINIT=1 gunicorn -w 1 -k gthread --threads 8 web_app:app
+# Every worker process loads its own copy of the models, so scale with threads first
+if os.environ.get("PHAI_AUTOINIT"):
+    initialize_app(os.environ.get("PHAI_INDEX_PATH", "./data/index"),
+                   os.environ.get("PHAI_MEDIA_PATH", "./organized_media"))
 
 
 if __name__ == '__main__':
@@ -118,5 +808,5 @@ if __name__ == '__main__':
     index_path = sys.argv[1] if len(sys.argv) > 1 else "./data/index"
     media_path = sys.argv[2] if len(sys.argv) > 2 else "./organized_media"
     initialize_app(index_path, media_path)
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
 